@@ -117,8 +117,39 @@ async function lightOff() {
   }
 }
 
+// Show what the light is showing now. The controller answers from its tracked state, so opening
+// the popup never sends anything to the light itself.
+async function loadLightStatus() {
+  const statusEl = document.getElementById('lightStatus');
+  try {
+    const result = await chrome.runtime.sendMessage({ type: 'LIGHT_STATUS' });
+    if (!result.success || result.response.status !== 'ok') {
+      statusEl.textContent = 'Light status unavailable';
+      return;
+    }
+
+    const light = result.response.lights[0];
+    const applied = result.response.applied;
+    if (light && light.is_on !== null) {
+      const age = light.age_s !== null ? ` (checked ${Math.round(light.age_s)}s ago)` : '';
+      statusEl.textContent = light.is_on && light.color
+        ? `Light is showing HSV(${light.color.hue}, ${light.color.saturation}, ${light.color.value})${age}`
+        : `Light is ${light.is_on ? 'on' : 'off'}${age}`;
+    } else if (applied) {
+      statusEl.textContent = applied.is_on && applied.color
+        ? `Light was last set to HSV(${applied.color.hue}, ${applied.color.saturation}, ${applied.color.value})`
+        : 'Light was last turned off';
+    } else {
+      statusEl.textContent = result.response.discovering ? 'Looking for the light...' : 'Light status unknown';
+    }
+  } catch (error) {
+    statusEl.textContent = 'Light status unavailable';
+  }
+}
+
 // Event listeners
 document.addEventListener('DOMContentLoaded', loadSettings);
+document.addEventListener('DOMContentLoaded', loadLightStatus);
 document.getElementById('testLightIssues').addEventListener('click', testLight);
 document.getElementById('lightOff').addEventListener('click', lightOff);
 
@@ -92,20 +92,26 @@ browser.runtime.onMessage.addListener((message, sender) => {
     // Test the light with a specific color or update
     const hasIssues = message.hasIssues !== undefined ? message.hasIssues : true;
     return lightController.updateLight(hasIssues)
-      .then(() => ({ success: true }))
+      .then(response => ({ success: true, response }))
       .catch(err => ({ success: false, error: err.message }));
   }
 
   if (message.type === 'LIGHT_SET_COLOR') {
     const { hue, saturation, value } = message;
     return lightController.setColor(hue, saturation, value)
-      .then(() => ({ success: true }))
+      .then(response => ({ success: true, response }))
       .catch(err => ({ success: false, error: err.message }));
   }
 
   if (message.type === 'LIGHT_OFF') {
     return lightController.turnOff()
-      .then(() => ({ success: true }))
+      .then(response => ({ success: true, response }))
+      .catch(err => ({ success: false, error: err.message }));
+  }
+
+  if (message.type === 'LIGHT_STATUS') {
+    return lightController.getStatus(message.maxAge)
+      .then(response => ({ success: true, response }))
       .catch(err => ({ success: false, error: err.message }));
   }
 });
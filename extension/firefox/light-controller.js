@@ -1,6 +1,7 @@
 // Light Controller - Communicates with native Python script to control Kasa light
 
 const NATIVE_APP_NAME = 'com.punchup.light';
+const REQUEST_TIMEOUT_MS = 30000; // Reject a call if the native host hasn't answered by then
 
 class LightController {
   constructor() {
@@ -8,6 +9,8 @@ class LightController {
     this.connected = false;
     this.reconnectAttempts = 0;
     this.maxReconnectAttempts = 3;
+    this.nextId = 1;
+    this.pending = new Map(); // Request id -> { resolve, reject, timer } for calls awaiting a response
   }
 
   connect() {
@@ -21,12 +24,9 @@ class LightController {
 
       this.port.onMessage.addListener((response) => {
         console.log('Light controller response:', response);
-        if (response.status === 'ok') {
-          this.connected = true;
-          this.reconnectAttempts = 0;
-        } else if (response.status === 'error') {
-          console.error('Light controller error:', response.message);
-        }
+        // A batch is answered with an array holding one response per action
+        const responses = Array.isArray(response) ? response : [response];
+        responses.forEach((r) => this.handleResponse(r));
       });
 
       this.port.onDisconnect.addListener(() => {
@@ -38,6 +38,7 @@ class LightController {
         if (error) {
           console.error('Disconnect error:', error.message);
         }
+        this.rejectPending(new Error('Light controller disconnected'));
 
         // Try to reconnect if not too many attempts
         if (this.reconnectAttempts < this.maxReconnectAttempts) {
@@ -57,27 +58,109 @@ class LightController {
     }
   }
 
-  sendMessage(message) {
+  handleResponse(response) {
+    if (response.status === 'ok') {
+      this.connected = true;
+      this.reconnectAttempts = 0;
+    } else if (response.status === 'error') {
+      console.error('Light controller error:', response.message);
+    }
+
+    // Without an id, the host couldn't read a frame well enough to say which calls it held.
+    // Fail them all rather than leave them waiting for REQUEST_TIMEOUT_MS.
+    if (response.id === undefined) {
+      if (response.status === 'error') {
+        this.rejectPending(new Error(response.message));
+      }
+      return;
+    }
+
+    // Responses may arrive in any order; the echoed id says which call they answer
+    const call = this.pending.get(response.id);
+    if (!call) {
+      return;
+    }
+    this.pending.delete(response.id);
+    clearTimeout(call.timer);
+
+    if (response.status === 'error') {
+      call.reject(new Error(response.message));
+    } else {
+      call.resolve(response);
+    }
+  }
+
+  rejectPending(error) {
+    this.rejectCalls([...this.pending.keys()], error);
+  }
+
+  // Reject only the given calls, e.g. those in a frame that couldn't be sent
+  rejectCalls(ids, error) {
+    for (const id of ids) {
+      const call = this.pending.get(id);
+      if (call) {
+        this.pending.delete(id);
+        clearTimeout(call.timer);
+        call.reject(error);
+      }
+    }
+  }
+
+  // Give a message an id and return it with a promise for its response
+  track(message) {
+    const id = this.nextId++;
+    const promise = new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        reject(new Error(`No response to ${message.action} after ${REQUEST_TIMEOUT_MS / 1000}s`));
+      }, REQUEST_TIMEOUT_MS);
+      this.pending.set(id, { resolve, reject, timer });
+    });
+    return { request: { ...message, id }, promise };
+  }
+
+  post(frame) {
     if (!this.port) {
       this.connect();
     }
 
     if (!this.port) {
       console.error('Cannot send message: not connected to light controller');
-      return Promise.reject(new Error('Not connected to light controller'));
+      throw new Error('Not connected to light controller');
     }
 
     try {
-      this.port.postMessage(message);
-      return Promise.resolve();
+      this.port.postMessage(frame);
     } catch (error) {
       console.error('Error sending message to light controller:', error);
       this.connected = false;
       this.port = null;
-      return Promise.reject(error);
+      throw error;
     }
   }
 
+  // Send one action; resolves with its response, rejects if it fails
+  sendMessage(message) {
+    const { request, promise } = this.track(message);
+    try {
+      this.post(request);
+    } catch (error) {
+      this.rejectCalls([request.id], error);
+    }
+    return promise;
+  }
+
+  // Send several actions in one frame to be run concurrently; returns one promise per action
+  sendBatch(messages) {
+    const calls = messages.map((message) => this.track(message));
+    try {
+      this.post(calls.map((call) => call.request));
+    } catch (error) {
+      this.rejectCalls(calls.map((call) => call.request.id), error);
+    }
+    return calls.map((call) => call.promise);
+  }
+
   async updateLight(hasIssues) {
     console.log(`Updating light: hasIssues=${hasIssues}`);
     return this.sendMessage({
@@ -103,6 +186,24 @@ class LightController {
     });
   }
 
+  // Play keyframes with the bulb's own transitions, e.g. { preset: 'pulse', color: {...}, duration: 2, repeat: 3 }
+  async animate(animation) {
+    console.log('Animating light:', animation);
+    return this.sendMessage({
+      action: 'animate',
+      ...animation
+    });
+  }
+
+  // What the light is showing, answered from the controller's tracked state without contacting the
+  // light. Pass maxAge (seconds) to have state older than that re-read from the light first.
+  async getStatus(maxAge) {
+    return this.sendMessage({
+      action: 'status',
+      ...(maxAge !== undefined && { maxAge })
+    });
+  }
+
   async discover() {
     console.log('Discovering light');
     return this.sendMessage({
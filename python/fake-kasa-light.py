@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Fake Kasa Light
+Emulates Kasa color bulbs on localhost for testing and benchmarking the controller without hardware.
+
+Each fake bulb speaks the legacy Kasa (IOT) protocol that python-kasa uses for KL130-style bulbs:
+XOR-obfuscated JSON over TCP with a 4-byte length prefix, plus the same payloads over UDP
+for discovery. Response latency, dropped responses and dropped connections are configurable
+so slow or flaky bulbs can be reproduced.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import struct
+import sys
+
+LIGHT_SERVICE = "smartlife.iot.smartbulb.lightingservice"
+EMETER_SERVICE = "smartlife.iot.common.emeter"
+XOR_KEY = 171
+
+
+def xor_encrypt(payload):
+    """Obfuscate a payload the way Kasa devices do (autokey XOR starting at 171)."""
+    key = XOR_KEY
+    out = bytearray()
+    for byte in payload:
+        key ^= byte
+        out.append(key)
+    return bytes(out)
+
+
+def xor_decrypt(payload):
+    key = XOR_KEY
+    out = bytearray()
+    for byte in payload:
+        out.append(key ^ byte)
+        key = byte
+    return bytes(out)
+
+
+class FakeBulb:
+    """State and request handling for one emulated color bulb."""
+
+    def __init__(self, index, latency=0.0, jitter=0.0, loss=0.0, disconnect=0.0):
+        self.index = index
+        self.latency = latency  # Seconds before each response
+        self.jitter = jitter  # Extra random seconds, up to this much
+        self.loss = loss  # Fraction of requests that never get a response
+        self.disconnect = disconnect  # Fraction of requests answered by closing the connection
+        self.alias = f"Fake Light {index + 1}"
+        self.mac = f"50:C7:BF:00:00:{index + 1:02X}"
+        self.light_state = {
+            "on_off": 0,
+            "dft_on_state": {"mode": "normal", "hue": 0, "saturation": 0, "color_temp": 2700, "brightness": 100}
+        }
+        self.requests = 0
+
+    def sysinfo(self):
+        return {
+            "sw_ver": "1.8.11 Build 191113 Rel.105336",
+            "hw_ver": "2.0",
+            "model": "KL130(US)",
+            "description": "Smart Wi-Fi LED Bulb with Color Changing",
+            "alias": self.alias,
+            "mic_type": "IOT.SMARTBULB",
+            "dev_state": "normal",
+            "mic_mac": self.mac.replace(":", ""),
+            "deviceId": f"80120000000000000000000000000000000000{self.index:02X}",
+            "oemId": "00000000000000000000000000000000",
+            "hwId": "00000000000000000000000000000000",
+            "is_factory": False,
+            "disco_ver": "1.0",
+            "ctrl_protocols": {"name": "Linkie", "version": "1.0"},
+            "light_state": self.light_state,
+            "is_dimmable": 1,
+            "is_color": 1,
+            "is_variable_color_temp": 1,
+            "preferred_state": [],
+            "rssi": -50,
+            "active_mode": "none",
+            "heapsize": 300000,
+            "err_code": 0
+        }
+
+    def set_light_state(self, params):
+        """Apply a transition_light_state request and return the resulting light state."""
+        on_off = params.get("on_off", self.light_state["on_off"])
+        if on_off:
+            current = self.light_state if self.light_state["on_off"] else self.light_state["dft_on_state"]
+            state = {key: current.get(key) for key in ("mode", "hue", "saturation", "color_temp", "brightness")}
+            for key in ("hue", "saturation", "color_temp", "brightness"):
+                if key in params:
+                    state[key] = params[key]
+            if "hue" in params or "saturation" in params:
+                state["color_temp"] = 0
+            self.light_state = {"on_off": 1, **state}
+        else:
+            previous = self.light_state if self.light_state["on_off"] else self.light_state["dft_on_state"]
+            self.light_state = {
+                "on_off": 0,
+                "dft_on_state": {key: value for key, value in previous.items() if key not in ("on_off", "dft_on_state")}
+            }
+        return {**self.light_state, "err_code": 0}
+
+    def handle(self, request):
+        """Answer a decoded request dict the way a KL130 would."""
+        self.requests += 1
+        response = {}
+        for module, methods in request.items():
+            if module == "system":
+                result = {}
+                for method in methods:
+                    if method == "get_sysinfo":
+                        result[method] = self.sysinfo()
+                    elif method == "set_dev_alias":
+                        self.alias = methods[method].get("alias", self.alias)
+                        result[method] = {"err_code": 0}
+                    else:
+                        result[method] = {"err_code": -2, "err_msg": "member not support"}
+                response[module] = result
+            elif module == LIGHT_SERVICE:
+                result = {}
+                for method, params in methods.items():
+                    if method == "transition_light_state":
+                        result[method] = self.set_light_state(params or {})
+                    elif method == "get_light_state":
+                        result[method] = {**self.light_state, "err_code": 0}
+                    else:
+                        result[method] = {"err_code": -2, "err_msg": "member not support"}
+                response[module] = result
+            elif module == EMETER_SERVICE and "get_realtime" in methods:
+                power_mw = 9000 * self.light_state.get("brightness", 0) // 100 if self.light_state["on_off"] else 0
+                response[module] = {"get_realtime": {"power_mw": power_mw, "err_code": 0}}
+            else:
+                response[module] = {"err_code": -1, "err_msg": "module not support"}
+        return response
+
+    async def delay(self):
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+
+    async def serve_tcp(self, reader, writer):
+        try:
+            while True:
+                header = await reader.readexactly(4)
+                length = struct.unpack(">I", header)[0]
+                request = json.loads(xor_decrypt(await reader.readexactly(length)))
+
+                await self.delay()
+                roll = random.random()
+                if roll < self.disconnect:
+                    break
+                if roll < self.disconnect + self.loss:
+                    continue
+
+                payload = json.dumps(self.handle(request)).encode()
+                writer.write(struct.pack(">I", len(payload)) + xor_encrypt(payload))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+class DiscoveryProtocol(asyncio.DatagramProtocol):
+    """Answers XOR discovery datagrams (no length prefix) with the bulb's sysinfo."""
+
+    def __init__(self, bulb):
+        self.bulb = bulb
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            request = json.loads(xor_decrypt(data))
+        except ValueError:
+            return
+        if random.random() < self.bulb.loss:
+            return
+        payload = json.dumps(self.bulb.handle(request)).encode()
+        self.transport.sendto(xor_encrypt(payload), addr)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Emulate Kasa color bulbs on localhost.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=9999, help="TCP/UDP port of the first bulb (default 9999)")
+    parser.add_argument("--count", type=int, default=1, help="Number of bulbs, on consecutive ports (default 1)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before each response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random seconds per response, up to this much")
+    parser.add_argument("--loss", type=float, default=0.0, help="Fraction of requests left unanswered")
+    parser.add_argument("--disconnect", type=float, default=0.0, help="Fraction of requests answered by disconnecting")
+    args = parser.parse_args()
+
+    loop = asyncio.get_running_loop()
+    bulbs = []
+    for index in range(args.count):
+        bulb = FakeBulb(index, args.latency, args.jitter, args.loss, args.disconnect)
+        port = args.port + index
+        await asyncio.start_server(bulb.serve_tcp, args.host, port)
+        await loop.create_datagram_endpoint(lambda bulb=bulb: DiscoveryProtocol(bulb), local_addr=(args.host, port))
+        bulbs.append({"host": args.host, "port": port, "alias": bulb.alias, "mac": bulb.mac})
+
+    # One line of JSON tells a parent process where the bulbs are
+    print(json.dumps({"bulbs": bulbs}), flush=True)
+    print(f"Emulating {args.count} bulb(s) on {args.host}:{args.port}", file=sys.stderr)
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
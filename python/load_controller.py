@@ -0,0 +1,13 @@
+"""
+Loads punch-light-controller.py for the scripts next to it, which run on top of its controller.
+
+Its file name isn't a valid identifier, so it can't be named in an import statement. It's
+imported by name instead, from the scripts' directory (the first entry on sys.path).
+"""
+
+import importlib
+
+
+def load_controller():
+    """Import punch-light-controller.py once and return the module."""
+    return importlib.import_module('punch-light-controller')
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Punch-Up Light Benchmark
+Measures the controller end to end against fake bulbs, without any hardware.
+
+Starts fake-kasa-light.py, then runs `punch-light-controller.py native` the way a browser does.
+Messages are sent as length-prefixed frames on its stdin. The benchmark reports:
+- startup: process launch to the first response (a stats message, which needs no light) and to the
+  first answered light command, plus the controller's own startup milestones
+- latency: message sent to response received, one message at a time (the response is only
+  sent once the bulb has acknowledged the write)
+- burst: throughput and time to the final color when many messages arrive at once
+- memory: peak RSS of the controller process
+
+The controller runs from a copy in a temporary directory, so its cache, socket and schedule
+never touch the real ones. Results are JSON tagged with the git commit, and --compare
+prints the change against an earlier result file.
+"""
+
+import argparse
+import asyncio
+import json
+import resource
+import shutil
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent.resolve()
+CONTROLLER = SCRIPT_DIR / "punch-light-controller.py"
+FAKE_LIGHT = SCRIPT_DIR / "fake-kasa-light.py"
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize_ms(samples):
+    return {
+        "count": len(samples),
+        "mean_ms": round(statistics.mean(samples) * 1000, 2),
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2)
+    }
+
+
+class NativeHost:
+    """A controller process in native messaging mode, driven through its stdin/stdout."""
+
+    def __init__(self, process):
+        self.process = process
+
+    @classmethod
+    async def start(cls, script, stderr):
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, str(script), "native",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=stderr
+        )
+        return cls(process)
+
+    async def send(self, message):
+        payload = json.dumps(message).encode('utf-8')
+        self.process.stdin.write(struct.pack('=I', len(payload)) + payload)
+        await self.process.stdin.drain()
+
+    async def receive(self):
+        header = await self.process.stdout.readexactly(4)
+        length = struct.unpack('=I', header)[0]
+        return json.loads(await self.process.stdout.readexactly(length))
+
+    async def request(self, message):
+        await self.send(message)
+        return await self.receive()
+
+    async def close(self):
+        """Close stdin like a browser does and wait for the process to exit."""
+        self.process.stdin.close()
+        await self.process.wait()
+
+
+def color_message(i):
+    """A set_color message that always differs from the previous one, so the bulb is written."""
+    return {"action": "set_color", "hue": (i * 37) % 360, "saturation": 100, "value": 50 + i % 2}
+
+
+async def run_benchmark(args, workdir):
+    # Start the fake bulbs and wait for them to report where they listen
+    fake = await asyncio.create_subprocess_exec(
+        sys.executable, str(FAKE_LIGHT),
+        "--port", str(args.port), "--count", str(args.lights),
+        "--latency", str(args.latency), "--jitter", str(args.jitter),
+        "--loss", str(args.loss), "--disconnect", str(args.disconnect),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL
+    )
+    try:
+        bulbs = json.loads(await fake.stdout.readline())["bulbs"]
+
+        # Cache the bulbs with full connection parameters, like after a real discovery
+        script = workdir / CONTROLLER.name
+        shutil.copy(CONTROLLER, script)
+        with open(workdir / "punch-light-cache.json", 'w') as f:
+            json.dump({"lights": [
+                {**bulb, "connection": {"device_family": "IOT.SMARTBULB", "encryption_type": "XOR", "https": False}}
+                for bulb in bulbs
+            ]}, f)
+
+        with open(workdir / "controller.log", 'w') as log:
+            # Startup: launch to first response, then to first answered light command
+            started = time.perf_counter()
+            host = await NativeHost.start(script, log)
+            await host.request({"action": "stats"})
+            first_response = time.perf_counter() - started
+            first = await host.request(color_message(0))
+            startup = time.perf_counter() - started
+            if first.get("status") != "ok":
+                raise RuntimeError(f"Controller couldn't set the fake light: {first}")
+            milestones = (await host.request({"action": "stats"})).get("startup", {})
+
+            # Latency: one message at a time
+            latencies = []
+            errors = 0
+            for i in range(1, args.messages + 1):
+                sent = time.perf_counter()
+                response = await host.request(color_message(i))
+                latencies.append(time.perf_counter() - sent)
+                errors += response.get("status") != "ok"
+
+            # Bursts: many messages at once, only the last color matters
+            burst_durations = []
+            final_color_times = []
+            for burst in range(args.bursts):
+                base = 1000 + burst * args.burst_size
+                sent = time.perf_counter()
+                for i in range(args.burst_size):
+                    await host.send(color_message(base + i))
+                final_color_at = None
+                for _ in range(args.burst_size):
+                    response = await host.receive()
+                    if response.get("status") == "ok" and not response.get("superseded"):
+                        final_color_at = time.perf_counter()
+                burst_durations.append(time.perf_counter() - sent)
+                if final_color_at is not None:
+                    final_color_times.append(final_color_at - sent)
+
+            await host.close()
+
+        # The controller was the only child process to exit so far
+        peak_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        peak_rss_kb = peak_rss // 1024 if sys.platform == "darwin" else peak_rss
+    finally:
+        fake.terminate()
+        await fake.wait()
+
+    total_burst_messages = args.bursts * args.burst_size
+    return {
+        "startup_ms": round(startup * 1000, 2),
+        "first_response_ms": round(first_response * 1000, 2),
+        "startup_milestones": milestones,
+        "latency": {**summarize_ms(latencies), "errors": errors},
+        "burst": {
+            "messages_per_s": round(total_burst_messages / sum(burst_durations), 1),
+            "all_responses": summarize_ms(burst_durations),
+            "final_color": summarize_ms(final_color_times) if final_color_times else None
+        },
+        "peak_rss_kb": peak_rss_kb
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(baseline, results, path=""):
+    """Print numeric results next to the baseline's, with the relative change."""
+    for key, value in results.items():
+        name = f"{path}{key}"
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        if isinstance(value, dict):
+            print_comparison(old or {}, value, f"{name}.")
+        elif isinstance(value, (int, float)) and isinstance(old, (int, float)) and not isinstance(value, bool):
+            change = f"{(value - old) / old * 100:+.1f}%" if old else "n/a"
+            print(f"{name:40} {old:>12} -> {value:>12}  {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark punch-light-controller.py against fake bulbs.")
+    parser.add_argument("--lights", type=int, default=1, help="Number of fake bulbs (default 1)")
+    parser.add_argument("--port", type=int, default=29999, help="Port of the first fake bulb (default 29999)")
+    parser.add_argument("--latency", type=float, default=0.02, help="Bulb response latency in seconds (default 0.02)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random bulb latency, up to this many seconds")
+    parser.add_argument("--loss", type=float, default=0.0, help="Fraction of bulb requests left unanswered")
+    parser.add_argument("--disconnect", type=float, default=0.0, help="Fraction of bulb requests answered by disconnecting")
+    parser.add_argument("--messages", type=int, default=100, help="Sequential messages for the latency test (default 100)")
+    parser.add_argument("--bursts", type=int, default=10, help="Number of bursts (default 10)")
+    parser.add_argument("--burst-size", type=int, default=50, help="Messages per burst (default 50)")
+    parser.add_argument("--output", type=Path, help="Also write the results to this JSON file")
+    parser.add_argument("--compare", type=Path, help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="punch-light-bench-") as workdir:
+        results = asyncio.run(run_benchmark(args, Path(workdir)))
+
+    report = {
+        "commit": git_commit(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {baseline.get('commit')}:")
+        print_comparison(baseline.get("results", {}), results)
+
+
+if __name__ == "__main__":
+    main()
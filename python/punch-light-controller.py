@@ -11,41 +11,191 @@ The light warns about punch issues with a color that gets more urgent over time:
 """
 
 import asyncio
+import bisect
+import contextlib
 import sys
 import json
 import struct
 import datetime
 import math
+import functools
 import getpass
+import importlib
 import os
+import random
+import signal
+import stat
+import threading
+import time
 from pathlib import Path
-from kasa import Discover, Module
 
-# Path to cache file for storing light IP address (in same directory as script)
+# When this module started running; startup milestones are measured from here
+STARTED_AT = time.perf_counter()
+
+# Path to cache file for storing how to reach each light (in same directory as script)
 SCRIPT_DIR = Path(__file__).parent.resolve()
 CACHE_FILE = SCRIPT_DIR / "punch-light-cache.json"
 
+# Journal of the latest light command and what was applied, so a restarted controller can restore the light
+STATE_FILE = SCRIPT_DIR / "punch-light-state.json"
+
+# Optional config file describing the warning color schedule (see DEFAULT_SCHEDULE)
+SCHEDULE_FILE = SCRIPT_DIR / "punch-light-schedule.json"
+
+# Where latency stats are dumped when PUNCH_LIGHT_STATS_INTERVAL (seconds) is set in the environment
+STATS_FILE = SCRIPT_DIR / "punch-light-stats.json"
+
+# Unix domain socket the controller daemon listens on
+SOCKET_PATH = SCRIPT_DIR / "punch-light.sock"
+
+# How long the last applied light state is trusted before it is re-read from the bulb (seconds).
+# Within this window, commands that wouldn't change the light skip all network traffic.
+STATE_MAX_AGE = 5 * 60
+
+# The color scheduler sleeps until the warning color next changes, but never longer than this
+# (seconds) at a time. asyncio timers follow the monotonic clock, so these short naps are what
+# let it notice wall-clock changes and suspend/resume.
+SCHEDULER_MAX_SLEEP = 10 * 60
+
+# Reapply the color at least this often even if it isn't due to change (seconds), to undo
+# changes made to the light outside the controller
+RESYNC_INTERVAL = 12 * 60 * 60
+
+# Wake this long after a color boundary (seconds) so the new color is already in effect
+COLOR_CHANGE_MARGIN = 1
+
+# Lights are discovered in the background at startup. A light command that arrives meanwhile waits
+# this long (seconds) for discovery to finish before it fails.
+READY_TIMEOUT = 15
+
+# Deadline for each action (seconds), which a message can override with "timeout" up to
+# MAX_ACTION_TIMEOUT. When it passes, device calls still in flight are cancelled and the action
+# fails with {"status": "error", "error": "timeout"}.
+ACTION_TIMEOUTS = {'update_light': 10, 'set_color': 10, 'turn_off': 10, 'discover': 30, 'animate': 10, 'status': 10}
+MAX_ACTION_TIMEOUT = 60
+
+# A light that misses a deadline is degraded: commands skip it at once until a background health
+# check reconnects to it. The check runs this often (seconds), giving each attempt HEALTH_CHECK_TIMEOUT.
+HEALTH_CHECK_INTERVAL = 30
+HEALTH_CHECK_TIMEOUT = 5
 
-def load_cached_ip():
-    """Load cached light IP address from file."""
+# After discovery fails, light commands fail fast while discovery is retried in the background.
+# The wait doubles after each failure from DISCOVERY_BACKOFF_MIN up to DISCOVERY_BACKOFF_MAX
+# (seconds), with random jitter so the LAN isn't probed on a fixed beat.
+DISCOVERY_BACKOFF_MIN = 5
+DISCOVERY_BACKOFF_MAX = 5 * 60
+
+# A keep-alive monitor pings every connected light this often (seconds), so commands find a warm,
+# verified connection. PUNCH_LIGHT_KEEPALIVE_INTERVAL in the environment overrides it; 0 turns it off.
+# A light whose ping fails is reconnected at once, then with backoff doubling up to KEEPALIVE_BACKOFF_MAX.
+KEEPALIVE_INTERVAL = 60
+KEEPALIVE_TIMEOUT = 3
+KEEPALIVE_BACKOFF_MAX = 5 * 60
+
+
+# python-kasa takes about half a second to import, longer than the rest of startup put together. It is
+# imported on first use instead, in a worker thread, so messages that don't need a light are answered meanwhile
+# and a host that only forwards to the daemon never imports it.
+_kasa_import = None
+
+
+def _import_kasa():
+    module = importlib.import_module('kasa')
+    record_startup('kasa_imported')
+    return module
+
+
+async def load_kasa():
+    """Import python-kasa if it isn't yet, and return the module."""
+    global _kasa_import
+    if _kasa_import is None:
+        _kasa_import = asyncio.create_task(asyncio.to_thread(_import_kasa))
+    # Shielded so a caller that times out doesn't cancel the import for everyone else
+    return await asyncio.shield(_kasa_import)
+
+
+def load_cached_lights():
+    """
+    Load cached light addresses from file.
+
+    Returns:
+        list: Entries like {'host': '192.168.1.100', 'alias': 'Desk Lamp', 'mac': '...',
+              'connection': {...}}, where 'mac' and 'connection' are absent for lights
+              cached by older versions or added through setup. An optional 'port' points
+              at a light on a non-standard port.
+    """
     try:
         if CACHE_FILE.exists():
             with open(CACHE_FILE, 'r') as f:
                 data = json.load(f)
-                return data.get('host')
+                if 'lights' in data:
+                    return [entry for entry in data['lights'] if entry.get('host')]
+                # Older caches held a single light
+                if data.get('host'):
+                    return [{'host': data['host']}]
     except Exception as e:
-        print(f"Warning: Failed to load cached IP: {e}", file=sys.stderr)
-    return None
+        print(f"Warning: Failed to load cached IPs: {e}", file=sys.stderr)
+    return []
 
 
-def save_cached_ip(host):
-    """Save light IP address to cache file."""
+def save_cached_lights(entries):
+    """
+    Save the light group's addresses to cache file.
+
+    Args:
+        entries: List of dicts as returned by load_cached_lights()
+    """
     try:
         with open(CACHE_FILE, 'w') as f:
-            json.dump({'host': host}, f)
-        print(f"Cached light IP: {host}", file=sys.stderr)
+            json.dump({'lights': entries}, f, indent=2)
+        print(f"Cached light IPs: {', '.join(entry['host'] for entry in entries)}", file=sys.stderr)
+    except Exception as e:
+        print(f"Warning: Failed to save cached IPs: {e}", file=sys.stderr)
+
+
+def load_journal():
+    """
+    Load the state journal written by save_journal().
+
+    Returns:
+        dict: {'has_issues': bool, 'request': {...}, 'requested_at': ..., 'applied': {...}, 'applied_at': ...},
+              with any key missing if it was never recorded, or {} if there's no usable journal
+    """
+    try:
+        if STATE_FILE.exists():
+            with open(STATE_FILE, 'r') as f:
+                journal = json.load(f)
+            # has_issues is null until the first update_light
+            if journal.get('has_issues') is not None and not isinstance(journal['has_issues'], bool):
+                raise ValueError(f"Invalid has_issues: {journal['has_issues']!r}")
+            request = journal.get('request')
+            if request is not None and request.get('action') not in ('update_light', 'set_color', 'turn_off'):
+                raise ValueError(f"Invalid request: {request!r}")
+            return journal
     except Exception as e:
-        print(f"Warning: Failed to save cached IP: {e}", file=sys.stderr)
+        print(f"Warning: Failed to load state journal: {e}", file=sys.stderr)
+    return {}
+
+
+def save_journal(journal):
+    """Replace the state journal atomically, so a crash mid-write never leaves a torn file."""
+    try:
+        temp_path = STATE_FILE.with_name(STATE_FILE.name + ".tmp")
+        with open(temp_path, 'w') as f:
+            json.dump(journal, f, indent=2)
+            # On disk before the rename, or a power loss could keep the rename but not the data
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, STATE_FILE)
+    except Exception as e:
+        print(f"Warning: Failed to save state journal: {e}", file=sys.stderr)
+
+
+def add_cached_light(host, alias):
+    """Add a light to the cached group, replacing any entry with the same host."""
+    entries = [entry for entry in load_cached_lights() if entry['host'] != host]
+    entries.append({'host': host, 'alias': alias})
+    save_cached_lights(entries)
 
 
 async def connect_light_to_wifi():
@@ -60,7 +210,8 @@ async def connect_light_to_wifi():
           "3. Press Enter to continue...")
 
     print("\nLooking for devices...")
-    found_devices = await Discover.discover()
+    kasa = await load_kasa()
+    found_devices = await kasa.Discover.discover()
 
     if len(found_devices) < 1:
         print("No devices found. Make sure you are connected to the light's WiFi network.")
@@ -98,15 +249,15 @@ async def connect_light_to_wifi():
         await asyncio.sleep(2)
 
         # Try to discover the light on the new network
-        new_devices = await Discover.discover()
+        new_devices = await kasa.Discover.discover()
         if new_devices:
             new_device = next(iter(new_devices.values()))
             await new_device.update()
             print(f"\nFound light at: {new_device.host}")
             print(f"Alias: {new_device.alias}")
 
-            # Save the IP to cache
-            save_cached_ip(new_device.host)
+            # Add the light to the cached group
+            add_cached_light(new_device.host, new_device.alias)
 
             print("\nSetup complete! You can now use the light with this script.")
         else:
@@ -129,212 +280,1776 @@ async def connect_light_to_wifi():
         sys.exit(1)
 
 
-class PunchLightController:
-    def __init__(self, host=None):
-        self.host = host
-        self.device = None
-        self.light = None  # Light module
-        self.last_has_issues = None  # Track last known issue state
-        self.periodic_task = None  # Background periodic update task
+# Latency metrics
+class LatencyHistogram:
+    """
+    Count, error count and latency distribution of one operation, in constant memory.
+
+    Latencies go into logarithmic buckets (each about 19% wider than the last), so percentiles
+    are accurate to within one bucket no matter how many samples are recorded.
+    """
+
+    MIN_LATENCY = 0.0001  # Upper bound of the first bucket (seconds)
+    GROWTH = 2 ** 0.25
+    BUCKETS = 96  # Covers up to ~1700 seconds; slower samples land in the last bucket
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * self.BUCKETS
+
+    def record(self, latency, error=False):
+        self.count += 1
+        if error:
+            self.errors += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+
+        if latency <= self.MIN_LATENCY:
+            index = 0
+        else:
+            index = math.ceil(math.log(latency / self.MIN_LATENCY, self.GROWTH))
+        self.buckets[min(index, self.BUCKETS - 1)] += 1
+
+    def percentile(self, fraction):
+        """Return the upper bound of the bucket holding the given fraction of samples."""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= rank:
+                return min(self.MIN_LATENCY * self.GROWTH ** index, self.max)
+        return self.max
+
+    def snapshot(self):
+        """Summarize as JSON-friendly milliseconds."""
+        def ms(seconds):
+            return None if seconds is None else round(seconds * 1000, 2)
+
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": ms(self.total / self.count) if self.count else None,
+            "p50_ms": ms(self.percentile(0.50)),
+            "p95_ms": ms(self.percentile(0.95)),
+            "p99_ms": ms(self.percentile(0.99)),
+            "max_ms": ms(self.max) if self.count else None
+        }
+
+
+# Seconds from STARTED_AT to each startup milestone, in the order reached, reported by the stats action
+startup_times = {}
+
+
+def record_startup(milestone):
+    """Note the first time a startup milestone, like 'first_response', is reached."""
+    startup_times.setdefault(milestone, time.perf_counter() - STARTED_AT)
+
+
+def startup_snapshot():
+    return {f"{milestone}_ms": round(seconds * 1000, 2) for milestone, seconds in startup_times.items()}
+
+
+class Metrics:
+    """Latency histograms keyed by operation name, like 'action.update_light' or 'device.set_hsv'."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.histograms = {}
+
+    def record(self, name, latency, error=False):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        histogram.record(latency, error)
+
+    @contextlib.contextmanager
+    def timed(self, name):
+        """Time the enclosed block (which may await) and count it as an error if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.record(name, time.perf_counter() - started, error=True)
+            raise
+        self.record(name, time.perf_counter() - started)
+
+    def snapshot(self):
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "operations": {name: histogram.snapshot() for name, histogram in sorted(self.histograms.items())}
+        }
+
+    def dump(self, path):
+        """Atomically write a snapshot to a JSON file."""
+        temp_path = path.with_name(path.name + ".tmp")
+        with open(temp_path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(temp_path, path)
+
+    async def dump_loop(self, path, interval):
+        """Background task that dumps a snapshot every interval seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.dump(path)
+            except Exception as e:
+                print(f"Warning: Failed to write stats to {path}: {e}", file=sys.stderr)
+
+
+# Weekly color schedule
+SECONDS_PER_WEEK = 7 * 24 * 60 * 60
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+_EPOCH = datetime.datetime(1970, 1, 1)
+_INHERIT = object()  # Override table entry meaning "no override, use the weekly schedule"
+
+# The built-in schedule, used when SCHEDULE_FILE doesn't exist
+DEFAULT_SCHEDULE = {
+    "no_issues": {"hue": 105, "saturation": 60, "value": 40},
+    "default": {"hue": 0, "saturation": 100, "value": 100},
+    "weekly": [
+        {
+            "start": "mon 17:00",
+            "end": "fri 09:00",
+            "from": {"hue": 60, "saturation": 100, "value": 100},
+            "to": {"hue": 0, "saturation": 100, "value": 100},
+            "steps": 60
+        }
+    ],
+    "overrides": []
+}
+
+SCHEDULE_CURVES = {
+    'linear': lambda p: p,
+    'ease-in': lambda p: p * p,
+    'ease-out': lambda p: 1 - (1 - p) * (1 - p),
+    'ease-in-out': lambda p: p * p * (3 - 2 * p),
+}
+
+
+def _parse_weekly_time(text):
+    """Parse 'mon 17:00' into seconds since Monday midnight."""
+    try:
+        day, clock = text.lower().split()
+        hour, minute = (int(part) for part in clock.split(':'))
+        if not (0 <= hour <= 23 and 0 <= minute <= 59):
+            raise ValueError
+        return WEEKDAYS.index(day[:3]) * 86400 + hour * 3600 + minute * 60
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid weekly time: {text!r} (expected like 'mon 17:00')")
+
+
+def _parse_date_time(text):
+    """Parse '2026-12-24 00:00' into local wall-clock seconds since the epoch."""
+    try:
+        return (datetime.datetime.fromisoformat(text) - _EPOCH).total_seconds()
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid date and time: {text!r} (expected like '2026-12-24 00:00')")
+
+
+def _parse_color(spec):
+    """Parse a schedule color: {'hue', 'saturation', 'value'} or 'off'. Returns a tuple or None for off."""
+    if spec == 'off':
+        return None
+    if not isinstance(spec, dict):
+        raise ValueError(f"Invalid color: {spec!r} (expected {{'hue', 'saturation', 'value'}} or 'off')")
+    return validate_hsv(spec.get('hue'), spec.get('saturation'), spec.get('value'))
+
+
+def _parse_curve(spec):
+    """Parse a curve name or a list of [progress, amount] points into a function of progress."""
+    if spec is None:
+        return SCHEDULE_CURVES['linear']
+    if isinstance(spec, str):
+        if spec not in SCHEDULE_CURVES:
+            raise ValueError(f"Unknown curve: {spec!r} (use one of {', '.join(SCHEDULE_CURVES)} or a list of points)")
+        return SCHEDULE_CURVES[spec]
+
+    try:
+        points = sorted((float(x), float(y)) for x, y in spec)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid curve points: {spec!r} (expected [[progress, amount], ...])")
+    if len(points) < 2 or points[0][0] != 0 or points[-1][0] != 1:
+        raise ValueError("Curve points must start at progress 0 and end at progress 1")
+    xs = [x for x, _ in points]
+
+    def curve(p):
+        i = min(max(bisect.bisect_right(xs, p) - 1, 0), len(points) - 2)
+        (x0, y0), (x1, y1) = points[i], points[i + 1]
+        return y0 if x1 == x0 else y0 + (y1 - y0) * (p - x0) / (x1 - x0)
+
+    return curve
+
+
+def _segment_steps(segment, start, end):
+    """
+    Expand a schedule segment into (time, color) steps covering [start, end).
+
+    Interpolated segments are split into equal time steps; each step shows the color reached
+    at the end of the step, truncated to whole numbers.
+    """
+    if 'color' in segment:
+        return [(start, _parse_color(segment['color']))]
+
+    if 'from' not in segment or 'to' not in segment:
+        raise ValueError("Schedule segment needs either 'color' or both 'from' and 'to'")
+
+    first = _parse_color(segment['from'])
+    last = _parse_color(segment['to'])
+    if first is None or last is None:
+        raise ValueError("Interpolated segments can't fade to or from 'off'")
+
+    curve = _parse_curve(segment.get('curve'))
+    steps = segment.get('steps') or max(1, *(abs(b - a) for a, b in zip(first, last)))
+    if not isinstance(steps, int) or steps < 1:
+        raise ValueError(f"Invalid steps: {steps!r} (must be a positive integer)")
+
+    duration = (end - start) / steps
+    result = []
+    for i in range(steps):
+        amount = curve((i + 1) / steps)
+        color = tuple(math.floor(a + (b - a) * amount + 1e-9) for a, b in zip(first, last))
+        result.append((start + i * duration, color))
+    return result
+
+
+class _BreakpointTable:
+    """Sorted breakpoint times with the color in effect from each one until the next."""
+
+    def __init__(self, origin, color, end=math.inf):
+        self.times = [origin]
+        self.colors = [color]
+        self.end = end  # Times at or after this are never looked up
+
+    def paint(self, start, end, steps):
+        """Replace whatever covers [start, end) with the given (time, color) steps."""
+        after = self.colors[bisect.bisect_right(self.times, end) - 1]
+        lo = bisect.bisect_left(self.times, start)
+        hi = bisect.bisect_left(self.times, end)
+        keep_end = hi < len(self.times) and self.times[hi] == end
+
+        times = [t for t, _ in steps]
+        colors = [c for _, c in steps]
+        if not keep_end and end < self.end:
+            times.append(end)
+            colors.append(after)
+
+        self.times[lo:hi] = times
+        self.colors[lo:hi] = colors
+
+    def merge(self):
+        """Drop breakpoints that don't change the color, so every breakpoint is a real change."""
+        times, colors = [self.times[0]], [self.colors[0]]
+        for t, c in zip(self.times[1:], self.colors[1:]):
+            if c != colors[-1]:
+                times.append(t)
+                colors.append(c)
+        self.times, self.colors = times, colors
+
+    def index(self, t):
+        return bisect.bisect_right(self.times, t) - 1
+
+
+class ColorSchedule:
+    """
+    Precompiled weekly warning color schedule.
+
+    Segments from the config are expanded once into sorted breakpoint tables: one for the
+    repeating week and one for dated overrides, which take precedence. Looking up the color
+    or the next change is then a bisect, however dense the schedule is.
+    """
+
+    def __init__(self, config):
+        """
+        Compile a schedule config (see DEFAULT_SCHEDULE for its shape).
+
+        Raises:
+            ValueError: If the config is invalid
+        """
+        self.no_issues_color = _parse_color(config.get('no_issues', DEFAULT_SCHEDULE['no_issues']))
+        if self.no_issues_color is None:
+            raise ValueError("The no_issues color can't be 'off'")
+
+        default = _parse_color(config.get('default', DEFAULT_SCHEDULE['default']))
+        self.weekly = _BreakpointTable(0, default, end=SECONDS_PER_WEEK)
+        for segment in config.get('weekly', []):
+            start = _parse_weekly_time(segment.get('start'))
+            end = _parse_weekly_time(segment.get('end'))
+            if end <= start:
+                end += SECONDS_PER_WEEK  # Wraps around the end of the week
+
+            steps = _segment_steps(segment, start, end)
+            if end <= SECONDS_PER_WEEK:
+                self.weekly.paint(start, end, steps)
+            else:
+                # Paint the part after the wrap first, starting with the color in effect at the wrap
+                wrapped = [(t - SECONDS_PER_WEEK, c) for t, c in steps if t >= SECONDS_PER_WEEK]
+                if not wrapped or wrapped[0][0] > 0:
+                    carried = [c for t, c in steps if t < SECONDS_PER_WEEK][-1]
+                    wrapped.insert(0, (0, carried))
+                self.weekly.paint(0, end - SECONDS_PER_WEEK, wrapped)
+                self.weekly.paint(start, SECONDS_PER_WEEK, [(t, c) for t, c in steps if t < SECONDS_PER_WEEK])
+        self.weekly.merge()
+
+        self.overrides = _BreakpointTable(-math.inf, _INHERIT)
+        for segment in config.get('overrides', []):
+            start = _parse_date_time(segment.get('start'))
+            end = _parse_date_time(segment.get('end'))
+            if end <= start:
+                raise ValueError(f"Override ends before it starts: {segment.get('start')} - {segment.get('end')}")
+            self.overrides.paint(start, end, _segment_steps(segment, start, end))
+        self.overrides.merge()
+
+    @staticmethod
+    def _week_offset(now):
+        """Seconds since this week's Monday midnight, in local wall-clock time."""
+        return (now.weekday() * 86400 + now.hour * 3600 + now.minute * 60 + now.second
+                + now.microsecond / 1e6)
+
+    def color_at(self, now):
+        """Return the (hue, saturation, value) scheduled at local time now, or None for off."""
+        override = self.overrides.colors[self.overrides.index((now - _EPOCH).total_seconds())]
+        if override is not _INHERIT:
+            return override
+        return self.weekly.colors[self.weekly.index(self._week_offset(now))]
+
+    def next_change(self, now):
+        """
+        Return the local time of the next breakpoint after now, or None if the color never changes.
+
+        Weekly breakpoints hidden under an override may be returned even though the color
+        doesn't change there.
+        """
+        absolute = (now - _EPOCH).total_seconds()
+        candidates = []
+
+        j = self.overrides.index(absolute)
+        if j + 1 < len(self.overrides.times):
+            candidates.append(self.overrides.times[j + 1] - absolute)
+
+        if self.overrides.colors[j] is _INHERIT and len(self.weekly.times) > 1:
+            offset = self._week_offset(now)
+            i = self.weekly.index(offset)
+            if i + 1 < len(self.weekly.times):
+                candidates.append(self.weekly.times[i + 1] - offset)
+            elif self.weekly.colors[0] != self.weekly.colors[-1]:
+                candidates.append(SECONDS_PER_WEEK - offset)
+            else:
+                # The last and first colors match, so the week wraps without a change
+                candidates.append(SECONDS_PER_WEEK + self.weekly.times[1] - offset)
+
+        if not candidates:
+            return None
+        return now + datetime.timedelta(seconds=min(candidates))
+
+    def colors_between(self, start, end, step):
+        """
+        Evaluate the schedule at start, start + step, ... before end, in one vectorized pass.
+
+        Gives the same color as color_at for every sample, but looks them all up at once with
+        NumPy instead of one datetime at a time, so a year at one-minute resolution takes milliseconds.
+
+        Args:
+            start: Local time of the first sample (whole seconds)
+            end: Local time the samples stop before
+            step: Whole seconds between samples
+
+        Returns:
+            tuple: NumPy arrays (times, on, hsv): local wall-clock seconds since the epoch, whether
+                   the light is on, and an (n, 3) array of hue, saturation and value (zero when off)
+        """
+        import numpy as np  # Only punch-light-preview.py needs it, so the controller never loads it otherwise
+
+        def table(colors):
+            on = np.array([c is not None and c is not _INHERIT for c in colors])
+            hsv = np.array([c if on else (0, 0, 0) for c, on in zip(colors, on)], dtype=np.int16).reshape(-1, 3)
+            return on, hsv, np.array([c is _INHERIT for c in colors])
+
+        times = np.arange(math.floor((start - _EPOCH).total_seconds()), math.ceil((end - _EPOCH).total_seconds()),
+                          step, dtype=np.int64)
+
+        # The epoch was a Thursday, three days after Monday midnight
+        offsets = (times + 3 * 86400) % SECONDS_PER_WEEK
+        weekly = np.searchsorted(np.array(self.weekly.times, dtype=float), offsets, side='right') - 1
+        weekly_on, weekly_hsv, _ = table(self.weekly.colors)
+        on, hsv = weekly_on[weekly], weekly_hsv[weekly]
+
+        overrides = np.searchsorted(np.array(self.overrides.times, dtype=float), times, side='right') - 1
+        override_on, override_hsv, inherit = table(self.overrides.colors)
+        overridden = ~inherit[overrides]
+        on[overridden] = override_on[overrides[overridden]]
+        hsv[overridden] = override_hsv[overrides[overridden]]
+
+        return times, on, hsv
+
+
+def load_schedule():
+    """Load and compile the color schedule, falling back to the built-in one."""
+    try:
+        if SCHEDULE_FILE.exists():
+            with open(SCHEDULE_FILE, 'r') as f:
+                return ColorSchedule(json.load(f))
+    except Exception as e:
+        print(f"Warning: Failed to load schedule from {SCHEDULE_FILE}, using the default: {e}", file=sys.stderr)
+    return ColorSchedule(DEFAULT_SCHEDULE)
+
+
+# Animations: keyframes played with the bulb's own transitions, so each keyframe is a single write
+MAX_KEYFRAMES = 32
+MAX_TRANSITION = 60  # Seconds; split longer fades into several keyframes
+MAX_ANIMATION_DURATION = 10 * 60  # Seconds, all repeats included
+# python-kasa only passes transitions on to IOT-protocol bulbs. Other bulbs are faded with a write this
+# often (seconds), starting from or ending at FADE_MIN_VALUE when the light turns on or off.
+FADE_STEP_INTERVAL = 0.5
+FADE_MIN_VALUE = 1
+
+
+def fade_color(start, end, fraction):
+    """The (hue, saturation, value) fraction of the way from start to end, the short way round the hue circle."""
+    hue = (end[0] - start[0] + 180) % 360 - 180
+    return (round(start[0] + hue * fraction) % 360,
+            round(start[1] + (end[1] - start[1]) * fraction),
+            round(start[2] + (end[2] - start[2]) * fraction))
+
+
+def _pulse(color, duration):
+    """Breathe: fade down to a fifth of the brightness and back up."""
+    dim = {**color, 'value': max(1, color['value'] // 5)}
+    return [{'color': dim, 'transition': duration / 2}, {'color': color, 'transition': duration / 2}]
+
+
+def _flash(color, duration):
+    """Blink: snap on, hold, snap off, hold."""
+    return [{'color': color, 'hold': duration / 2}, {'color': 'off', 'hold': duration / 2}]
+
+
+# Each preset builds the keyframes for one cycle from a color and the cycle's duration (seconds)
+ANIMATION_PRESETS = {
+    'fade': lambda color, duration: [{'color': color, 'transition': duration}],
+    'pulse': _pulse,
+    'flash': _flash
+}
+
+
+def _parse_seconds(spec, name, maximum):
+    if isinstance(spec, bool) or not isinstance(spec, (int, float)) or not 0 <= spec <= maximum:
+        raise ValueError(f"Invalid {name}: {spec!r} (must be 0-{maximum} seconds)")
+    return float(spec)
+
+
+def parse_animation(spec):
+    """
+    Parse an animate message into keyframes and a repeat count.
+
+    The message has either 'keyframes', a list of {'color': {...} or 'off', 'transition': seconds,
+    'hold': seconds} or {'effect': name, 'hold': seconds}, or a 'preset' from ANIMATION_PRESETS
+    with a 'color' and a 'duration'. 'repeat' plays the keyframes several times.
+
+    Returns:
+        tuple: (keyframes, repeat), each keyframe a dict with 'color' ((h, s, v) or None for off),
+               'effect' (name or None), 'transition' and 'hold' (seconds)
+
+    Raises:
+        ValueError: If the spec is invalid or would run longer than MAX_ANIMATION_DURATION
+    """
+    if 'preset' in spec:
+        preset = ANIMATION_PRESETS.get(spec['preset'])
+        if preset is None:
+            raise ValueError(f"Unknown preset: {spec['preset']!r} (use one of {', '.join(ANIMATION_PRESETS)})")
+        color = spec.get('color')
+        _parse_color(color)
+        if color == 'off':
+            raise ValueError("A preset needs a color, not 'off'")
+        frames = preset(color, _parse_seconds(spec.get('duration', 2), 'duration', MAX_TRANSITION))
+    else:
+        frames = spec.get('keyframes')
+        if not isinstance(frames, list) or not frames:
+            raise ValueError("Missing 'keyframes' (a list) or 'preset'")
+
+    if len(frames) > MAX_KEYFRAMES:
+        raise ValueError(f"Too many keyframes: {len(frames)} (max allowed: {MAX_KEYFRAMES})")
+
+    keyframes = []
+    for frame in frames:
+        if not isinstance(frame, dict):
+            raise ValueError(f"Invalid keyframe: {frame!r}")
+        effect = frame.get('effect')
+        if effect is not None and not (isinstance(effect, str) and effect):
+            raise ValueError(f"Invalid effect: {effect!r}")
+        keyframes.append({
+            'color': None if effect else _parse_color(frame.get('color')),
+            'effect': effect,
+            'transition': 0.0 if effect else _parse_seconds(frame.get('transition', 0), 'transition', MAX_TRANSITION),
+            'hold': _parse_seconds(frame.get('hold', 0), 'hold', MAX_ANIMATION_DURATION)
+        })
+
+    repeat = spec.get('repeat', 1)
+    if isinstance(repeat, bool) or not isinstance(repeat, int) or repeat < 1:
+        raise ValueError(f"Invalid repeat: {repeat!r} (must be a positive integer)")
+
+    duration = repeat * sum(keyframe['transition'] + keyframe['hold'] for keyframe in keyframes)
+    if duration > MAX_ANIMATION_DURATION:
+        raise ValueError(f"Animation too long: {duration:g}s (max allowed: {MAX_ANIMATION_DURATION}s)")
+    return keyframes, repeat
+
+
+class LightCommandQueue:
+    """
+    Runs light commands one at a time, collapsing a backlog down to the newest command.
+
+    Commands that only set the light's target state (update_light, set_color, turn_off) make
+    every older pending command pointless, so while one command is in flight at most one more
+    is kept waiting. Each newer submission replaces the waiting one, whose caller is told it
+    was superseded. The light reaches the final requested state after the in-flight command
+    plus one more round-trip, however long the burst.
+    """
+
+    def __init__(self):
+        self._pending = None  # (command, future) waiting for the in-flight command to finish
+        self._worker = None
+
+    @property
+    def busy(self):
+        """Whether a command is in flight."""
+        return self._worker is not None and not self._worker.done()
+
+    async def submit(self, command):
+        """
+        Queue a command and wait for its result.
+
+        Args:
+            command: Zero-argument callable returning an awaitable that applies the command
+
+        Returns:
+            dict: The command's result with "superseded": False, or a superseded response
+        """
+        future = asyncio.get_running_loop().create_future()
+
+        if self._pending is not None:
+            _, superseded = self._pending
+            if not superseded.done():
+                superseded.set_result({
+                    "status": "ok",
+                    "superseded": True,
+                    "message": "Superseded by a newer light command"
+                })
+
+        self._pending = (command, future)
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+        return await future
+
+    async def _run(self):
+        while self._pending is not None:
+            command, future = self._pending
+            self._pending = None
+
+            if future.done():
+                continue
+
+            try:
+                result = await command()
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+
+            if not future.done():
+                future.set_result({**result, "superseded": False})
+
+
+class ActionTimeoutError(Exception):
+    """An action missed its deadline; device calls still in flight were cancelled."""
+    error = "timeout"
+
+
+class LightDegradedError(Exception):
+    """A light that timed out is skipped until a health check reaches it again."""
+    error = "degraded"
+
+
+class LightUnavailableError(Exception):
+    """No lights were found, and discovery is backing off before it tries again."""
+    error = "unavailable"
+
+    def __init__(self, message, retry_in):
+        super().__init__(message)
+        self.retry_in = retry_in  # Seconds until the next discovery attempt
+
+
+def normalize_mac(mac):
+    """Compare MAC addresses regardless of case and separator."""
+    return mac.replace('-', ':').upper() if mac else mac
+
+
+class KasaLight:
+    """
+    One bulb in the controller's group.
+
+    Each light tracks its own applied state and has its own command queue, so a slow or
+    unreachable bulb never holds up the others.
+    """
+
+    def __init__(self, host, alias=None, mac=None, connection=None, port=None, state_max_age=STATE_MAX_AGE,
+                 metrics=None):
+        self.host = host
+        self.port = port  # Only set for lights on a non-standard port, like fake-kasa-light.py
+        self.alias = alias
+        self.mac = mac  # Identifies the bulb if DHCP gives it a new IP
+        self.connection = connection  # Cached DeviceConnectionParameters, as a dict
+        self.device = None
+        self.light = None  # Light module
+        self.state_max_age = state_max_age
+        self.applied_state = None  # Last known {'is_on': bool, 'hsv': (h, s, v)} of the bulb
+        self.applied_at = None  # time.monotonic() when applied_state was last confirmed
+        self.fade_from = None  # Color a stepped fade started from, see apply_fade_step()
+        self.command_queue = LightCommandQueue()  # Coalesces bursts of light commands
+        self.connection_lock = asyncio.Lock()  # Held while connecting or dropping, so only one device is open
+        self.degraded = False  # Set when a command times out, cleared by check_health()
+        self.pings = 0  # Keep-alive pings sent
+        self.ping_failures = 0
+        self.reconnects = 0  # Successful keep-alive reconnects
+        self.reconnect_failures = 0  # Failed keep-alive reconnects in a row
+        self.reconnect_at = 0  # time.monotonic() of the next keep-alive reconnect attempt
+        self.metrics = metrics or Metrics()  # Device call latencies, usually shared with the controller
+
+    @classmethod
+    def from_cache(cls, entry, state_max_age=STATE_MAX_AGE, metrics=None):
+        return cls(
+            entry['host'],
+            entry.get('alias'),
+            mac=entry.get('mac'),
+            connection=entry.get('connection'),
+            port=entry.get('port'),
+            state_max_age=state_max_age,
+            metrics=metrics
+        )
+
+    @property
+    def name(self):
+        return self.alias or self.host
+
+    def describe(self):
+        """Identify this light in responses."""
+        return {"host": self.host, "alias": self.alias}
+
+    def cache_entry(self):
+        """Everything needed to connect straight to this light next time."""
+        entry = {"host": self.host, "alias": self.alias}
+        if self.port:
+            entry["port"] = self.port
+        if self.mac:
+            entry["mac"] = self.mac
+        if self.connection:
+            entry["connection"] = self.connection
+        return entry
+
+    async def connect(self, device=None):
+        """
+        Connect to the bulb and verify it supports HSV color.
+
+        With cached connection parameters this is a direct connection with no protocol probing.
+        Otherwise the host is probed with discover_single first.
+
+        Args:
+            device: An already discovered device for this light, to skip probing its host again
+
+        Raises:
+            Exception: If the device can't be reached, isn't an HSV light, or has a different
+                MAC address than the cached one (its IP was given to another device)
+        """
+        async with self.connection_lock:
+            await self._connect(device)
+
+    async def _connect(self, device):
+        kasa = await load_kasa()
+        if device is None and self.connection:
+            config = kasa.DeviceConfig(
+                host=self.host,
+                port_override=self.port,
+                connection_type=kasa.DeviceConnectionParameters.from_dict(self.connection)
+            )
+            # Device.connect already fetches the full device state
+            with self.metrics.timed("device.connect"):
+                device = await kasa.Device.connect(config=config)
+        else:
+            if device is None:
+                with self.metrics.timed("device.discover_single"):
+                    device = await kasa.Discover.discover_single(self.host, port=self.port)
+            with self.metrics.timed("device.update"):
+                await device.update()
+
+        if self.mac and normalize_mac(device.mac) != normalize_mac(self.mac):
+            await device.disconnect()
+            raise Exception(f"Device at {device.host} is {device.mac}, not the cached light {self.mac}")
+
+        # Get the Light module and verify it has HSV support
+        if kasa.Module.Light not in device.modules:
+            raise Exception(f"Device {device.alias} is not a light.")
+
+        light = device.modules[kasa.Module.Light]
+
+        if not light.has_feature("hsv"):
+            raise Exception(f"Light {device.alias} doesn't support HSV color control.")
+
+        # Replacing a connection, e.g. after finding the bulb at a new IP, closes the old one
+        previous = self.device
+        self.device = device
+        self.light = light
+        if previous is not None and previous is not device:
+            with contextlib.suppress(Exception):
+                await previous.disconnect()
+        self.host = device.host
+        self.alias = device.alias
+        self.mac = device.mac
+        self.connection = device.config.connection_type.to_dict()
+        self._record_state(device.is_on, tuple(light.hsv)[:3])
+
+        print(f"Connected to light: {self.alias} at {self.host}", file=sys.stderr)
+
+    async def ensure_connected(self):
+        if self.device is None:
+            async with self.connection_lock:
+                # Someone else may have connected while this waited for the lock
+                if self.device is None:
+                    await self._connect(None)
+
+    async def submit(self, command, deadline):
+        """
+        Queue command(self) on this light and wait for its result until the deadline.
+
+        Args:
+            command: Callable taking the light and returning an awaitable, e.g. lambda light: light.apply_off()
+            deadline: Event loop time by which the command must have finished
+
+        Raises:
+            LightDegradedError: If the light timed out earlier and hasn't passed a health check since
+            ActionTimeoutError: If the deadline passed first
+        """
+        if self.degraded:
+            raise LightDegradedError("Not responding, skipped until it reconnects")
+
+        try:
+            async with asyncio.timeout_at(deadline):
+                return await self.command_queue.submit(functools.partial(self._run, command, deadline))
+        except TimeoutError:
+            raise ActionTimeoutError("No response before the deadline")
+
+    async def _run(self, command, deadline):
+        """Run a queued command, cancelling it and degrading the light if it's still running at the deadline."""
+        if self.degraded:
+            raise LightDegradedError("Not responding, skipped until it reconnects")
+
+        try:
+            async with asyncio.timeout_at(deadline):
+                return await command(self)
+        except TimeoutError:
+            await self._degrade()
+            raise ActionTimeoutError("No response before the deadline")
+
+    async def _degrade(self):
+        """Drop the connection to a bulb that stopped answering; a cancelled request leaves it unusable."""
+        print(f"{self.name} stopped responding, skipping it until it reconnects", file=sys.stderr)
+        self.degraded = True
+        await self._drop_connection()
+
+    async def _drop_connection(self):
+        """Close the connection; the bulb's state is unknown until it's connected again."""
+        async with self.connection_lock:
+            self.applied_at = None
+            device, self.device, self.light = self.device, None, None
+            if device is not None:
+                with contextlib.suppress(Exception):
+                    await device.disconnect()
+
+    @property
+    def iot(self):
+        """Whether the bulb speaks the legacy IOT protocol rather than SMART, as far as the last connection showed."""
+        return (self.connection or {}).get("device_family", "").startswith("IOT.")
+
+    async def ping(self, timeout=KEEPALIVE_TIMEOUT):
+        """
+        Send the cheapest request the bulb answers over the open connection.
+
+        Raises:
+            Exception: If the bulb doesn't answer within timeout seconds
+        """
+        if self.iot:
+            request = {"system": {"get_sysinfo": {}}}
+        else:
+            request = {"get_device_info": None}
+
+        with self.metrics.timed("keepalive.ping"):
+            async with asyncio.timeout(timeout):
+                await self.device.protocol.query(request)
+
+    async def keep_alive(self, interval, timeout=KEEPALIVE_TIMEOUT):
+        """
+        One round of the keep-alive monitor: ping the connection, or reconnect if it's gone.
+
+        A failed ping drops the connection and reconnects right away. Failed reconnects are
+        retried on later rounds with exponential backoff from interval up to KEEPALIVE_BACKOFF_MAX.
+
+        Lights with a command in flight are skipped: the command is using the connection, and a
+        ping would only wait behind it and count the wait against its timeout.
+        """
+        if self.command_queue.busy:
+            return
+
+        if self.device is not None:
+            try:
+                await self.ping(timeout)
+            except Exception as e:
+                if self.command_queue.busy:
+                    # A command started meanwhile and the ping waited behind it; leave its connection be
+                    return
+                self.pings += 1
+                self.ping_failures += 1
+                print(f"Keep-alive ping to {self.name} failed: {str(e) or f'no answer within {timeout}s'}",
+                      file=sys.stderr)
+                await self._drop_connection()
+            else:
+                self.pings += 1
+                return
+        elif time.monotonic() < self.reconnect_at:
+            return
+
+        try:
+            with self.metrics.timed("keepalive.reconnect"):
+                async with asyncio.timeout(timeout):
+                    await self.ensure_connected()
+        except Exception as e:
+            self.reconnect_failures += 1
+            backoff = min(KEEPALIVE_BACKOFF_MAX, interval * 2 ** min(self.reconnect_failures - 1, 16))
+            backoff *= random.uniform(0.5, 1)
+            self.reconnect_at = time.monotonic() + backoff
+            print(f"Couldn't reconnect to {self.name}, retrying in {backoff:.0f}s: {str(e) or 'timed out'}",
+                  file=sys.stderr)
+            return
+
+        self.reconnects += 1
+        self.reconnect_failures = 0
+
+    def keepalive_stats(self):
+        return {
+            "connected": self.device is not None,
+            "pings": self.pings,
+            "ping_success_rate": round(1 - self.ping_failures / self.pings, 4) if self.pings else None,
+            "reconnects": self.reconnects
+        }
+
+    async def check_health(self, timeout=HEALTH_CHECK_TIMEOUT):
+        """
+        Try to reconnect to a degraded light, clearing degraded on success.
+
+        Returns:
+            bool: Whether the light answered
+        """
+        try:
+            with self.metrics.timed("health_check"):
+                async with asyncio.timeout(timeout):
+                    await self.connect()
+        except Exception as e:
+            print(f"{self.name} still not responding: {str(e) or f'no answer within {timeout}s'}", file=sys.stderr)
+            return False
+
+        self.degraded = False
+        print(f"{self.name} is responding again", file=sys.stderr)
+        return True
+
+    def status(self):
+        """What the light is showing as far as the controller knows, without contacting it."""
+        state = self.applied_state or {}
+        hsv = state.get("hsv")
+        return {
+            **self.describe(),
+            "connected": self.device is not None,
+            "degraded": self.degraded,
+            "is_on": state.get("is_on"),
+            "color": {"hue": hsv[0], "saturation": hsv[1], "value": hsv[2]} if hsv else None,
+            # Seconds since the state was confirmed by the bulb; None if it's unknown or a write failed since
+            "age_s": None if self.applied_at is None else round(time.monotonic() - self.applied_at, 1)
+        }
+
+    async def refresh_state(self, max_age, deadline):
+        """
+        Re-read the bulb if the tracked state is unknown or older than max_age seconds.
+
+        A bulb that doesn't answer by the deadline is degraded, like after a command timeout,
+        unless a command is in flight: the read may just have waited behind it, and the command's
+        own deadline catches a bulb that really stopped answering.
+        """
+        try:
+            async with asyncio.timeout_at(deadline):
+                await self.ensure_connected()
+                await self._sync_state(max_age)
+        except TimeoutError:
+            if not self.command_queue.busy:
+                await self._degrade()
+            raise ActionTimeoutError("No response before the deadline")
+
+    def _record_state(self, is_on, hsv):
+        """Remember what the bulb is showing now, confirmed by a read or a successful write."""
+        self.applied_state = {"is_on": is_on, "hsv": hsv}
+        self.applied_at = time.monotonic()
+
+    def _state_is_fresh(self, max_age=None):
+        """Whether the tracked state is recent enough (state_max_age by default) to skip re-reading the bulb."""
+        max_age = self.state_max_age if max_age is None else max_age
+        return self.applied_at is not None and time.monotonic() - self.applied_at < max_age
+
+    async def _sync_state(self, max_age=None):
+        """Re-read on/off and color from the bulb if the tracked state is missing or stale."""
+        if self._state_is_fresh(max_age):
+            return
+
+        with self.metrics.timed("device.update"):
+            await self.device.update()
+        self._record_state(self.device.is_on, tuple(self.light.hsv)[:3])
+
+    async def apply_color(self, hue, saturation, value):
+        """
+        Turn the light on at the given color, skipping writes the bulb already reflects.
+
+        Returns:
+            dict: Result with "changed" set if anything was written to the bulb
+        """
+        await self.ensure_connected()
+        await self._sync_state()
+
+        target = (hue, saturation, value)
+        if self.applied_state["is_on"] and self.applied_state["hsv"] == target:
+            return {"status": "ok", "changed": False}
+
+        try:
+            if not self.applied_state["is_on"]:
+                with self.metrics.timed("device.turn_on"):
+                    await self.device.turn_on()
+            with self.metrics.timed("device.set_hsv"):
+                await self.light.set_hsv(hue, saturation, value)
+        except Exception:
+            # A partial write leaves the bulb in an unknown state
+            self.applied_at = None
+            raise
+
+        self._record_state(True, target)
+        return {"status": "ok", "changed": True}
+
+    async def apply_keyframe(self, keyframe):
+        """
+        Start one animation keyframe: a hardware transition to a color or to off, or a built-in effect.
+
+        This is always a write (plus turning the bulb on first if it's off). The bulb's state is
+        in motion, so there's no point comparing it with the tracked state.
+
+        Bulbs that ignore transitions (every bulb but IOT ones) only get the fade's starting point here,
+        and the controller calls apply_fade_step() for the rest.
+
+        Args:
+            keyframe: A keyframe from parse_animation()
+        """
+        await self.ensure_connected()
+        transition = round(keyframe["transition"] * 1000)
+        stepped = transition > 0 and not self.iot
+        state = self.applied_state
+        self.fade_from = None
+
+        try:
+            if keyframe["effect"] is not None:
+                kasa = await load_kasa()
+                effects = self.device.modules.get(kasa.Module.LightEffect)
+                if effects is None:
+                    raise Exception(f"{self.name} has no light effects")
+                with self.metrics.timed("device.set_effect"):
+                    await effects.set_effect(keyframe["effect"])
+                # The bulb shows the effect now, which no later color command matches
+                self._record_state(True, None)
+
+            elif keyframe["color"] is None:
+                if stepped and state["is_on"] and state["hsv"]:
+                    self.fade_from = state["hsv"]
+                else:
+                    with self.metrics.timed("device.turn_off"):
+                        await self.device.turn_off(transition=transition)
+                    self._record_state(False, state["hsv"])
+
+            elif stepped:
+                self.fade_from = state["hsv"] if state["is_on"] and state["hsv"] else None
+                if self.fade_from is None:
+                    # Light up dimly in the target's hue, and fade up from there
+                    self.fade_from = (*keyframe["color"][:2], FADE_MIN_VALUE)
+                    with self.metrics.timed("device.turn_on"):
+                        await self.device.turn_on()
+                    with self.metrics.timed("device.set_hsv"):
+                        await self.light.set_hsv(*self.fade_from)
+                    self._record_state(True, self.fade_from)
+
+            else:
+                if not state["is_on"]:
+                    with self.metrics.timed("device.turn_on"):
+                        await self.device.turn_on(transition=transition)
+                with self.metrics.timed("device.set_hsv"):
+                    await self.light.set_hsv(*keyframe["color"], transition=transition)
+                self._record_state(True, keyframe["color"])
+        except Exception:
+            self.applied_at = None
+            raise
+
+        return {"status": "ok", "changed": True}
+
+    async def apply_fade_step(self, keyframe, fraction):
+        """
+        Write one step of a fade the bulb can't run itself: the color fraction of the way from where
+        apply_keyframe() left it to the keyframe's color, turning off at the end of a fade to off.
+
+        Bulbs that ran the transition themselves have nothing to do.
+        """
+        if self.fade_from is None:
+            return {"status": "ok", "changed": False}
+
+        await self.ensure_connected()
+        start, target = self.fade_from, keyframe["color"]
+        try:
+            if target is None and fraction >= 1:
+                with self.metrics.timed("device.turn_off"):
+                    await self.device.turn_off()
+                self._record_state(False, start)
+            else:
+                color = fade_color(start, target or (*start[:2], FADE_MIN_VALUE), fraction)
+                with self.metrics.timed("device.set_hsv"):
+                    await self.light.set_hsv(*color)
+                self._record_state(True, color)
+        except Exception:
+            self.applied_at = None
+            raise
+
+        if fraction >= 1:
+            self.fade_from = None
+        return {"status": "ok", "changed": True}
+
+    async def stop_effect(self):
+        """Turn off a built-in light effect, if the bulb has them and one is running."""
+        await self.ensure_connected()
+        kasa = await load_kasa()
+        effects = self.device.modules.get(kasa.Module.LightEffect)
+        if effects is None or effects.effect == effects.LIGHT_EFFECTS_OFF:
+            return {"status": "ok", "changed": False}
+
+        with self.metrics.timed("device.set_effect"):
+            await effects.set_effect(effects.LIGHT_EFFECTS_OFF)
+        self.applied_at = None
+        return {"status": "ok", "changed": True}
+
+    async def apply_off(self):
+        """
+        Turn the light off unless it already is.
+
+        Returns:
+            dict: Result with "changed" set if anything was written to the bulb
+        """
+        await self.ensure_connected()
+        await self._sync_state()
+
+        if not self.applied_state["is_on"]:
+            return {"status": "ok", "changed": False}
+
+        try:
+            with self.metrics.timed("device.turn_off"):
+                await self.device.turn_off()
+        except Exception:
+            self.applied_at = None
+            raise
+
+        self._record_state(False, self.applied_state["hsv"])
+        return {"status": "ok", "changed": True}
+
+
+def action_deadline(action, timeout=None):
+    """Event loop time by which an action must finish, from its timeout or ACTION_TIMEOUTS."""
+    return asyncio.get_running_loop().time() + (timeout or ACTION_TIMEOUTS[action])
+
+
+class PunchLightController:
+    def __init__(self, host=None, state_max_age=STATE_MAX_AGE, schedule=None):
+        self.host = host
+        self.schedule = schedule or load_schedule()  # Compiled once, shared by every lookup
+        self.metrics = Metrics()
+        self.lights = []  # KasaLight group that every action is applied to
+        self.journal = load_journal()  # Persisted copy of the state below, see record_request()
+        self.last_has_issues = self.journal.get('has_issues')  # Track last known issue state
+        self.latest_request = self.journal.get('request')  # Latest light command message, reapplied on recovery
+        self.reapply_requests = True  # Off when something else drives the lights, like team mode
+        self.periodic_task = None  # Background periodic update task
+        self.stats_task = None  # Background stats dump task, if enabled
+        self.health_task = None  # Background health check, running while any light is degraded
+        self.keepalive_task = None  # Background keep-alive pings, if enabled
+        self.restore_task = None  # Reapplies the journaled state after a restart
+        self.animation_task = None  # Animation playing in the background, stopped by any other light command
+        self.keepalive_interval = None
+        self.ready = None  # Latest background discovery task, done once the lights are ready (or it failed)
+        self.rediscovery_task = None  # Retries discovery with backoff while no lights are found
+        self.discovery_failures = 0  # Failed discoveries in a row
+        self.discovery_retry_at = None  # time.monotonic() of the next attempt while backing off
+        self.discovery_error = None  # Why the last discovery failed
+        self.state_max_age = state_max_age
+        self.discovery_lock = asyncio.Lock()  # Only one discovery at a time
+
+    def stop(self):
+        """Cancel the controller's background tasks."""
+        for task in (self.ready, self.rediscovery_task, self.restore_task, self.periodic_task, self.stats_task,
+                     self.health_task, self.keepalive_task, self.animation_task):
+            if task is not None:
+                task.cancel()
+
+    def start_discovery(self):
+        """Start discovering the lights in the background; ensure_lights() waits for it."""
+        async def discover():
+            try:
+                await self.discover_lights()
+            except Exception as e:
+                print(f"Warning: Could not discover light: {e}", file=sys.stderr)
+
+        self.ready = asyncio.create_task(discover())
+
+    @property
+    def discovering(self):
+        """Whether a background discovery is running."""
+        return self.ready is not None and not self.ready.done()
+
+    async def discover_lights(self):
+        """
+        Find the group of Kasa lights to control, using cached IPs if available.
+
+        A failure starts backing off: light commands fail fast and discovery is retried in
+        the background.
+
+        Returns:
+            list: The KasaLight group
+        """
+        async with self.discovery_lock:
+            try:
+                with self.metrics.timed("discovery"):
+                    lights = await self._discover_lights()
+            except Exception as e:
+                self._discovery_failed(e)
+                raise
+
+        self.discovery_failures = 0
+        self.discovery_retry_at = None
+        self.discovery_error = None
+        record_startup('lights_ready')
+        return lights
+
+    def _discovery_failed(self, error):
+        """Schedule the next discovery attempt with exponential backoff and jitter."""
+        self.discovery_failures += 1
+        backoff = min(DISCOVERY_BACKOFF_MAX, DISCOVERY_BACKOFF_MIN * 2 ** min(self.discovery_failures - 1, 16))
+        backoff *= random.uniform(0.5, 1)
+        self.discovery_retry_at = time.monotonic() + backoff
+        self.discovery_error = str(error)
+        print(f"Discovery failed {self.discovery_failures} time(s) in a row, retrying in {backoff:.0f}s", file=sys.stderr)
+
+        if self.rediscovery_task is None or self.rediscovery_task.done():
+            self.rediscovery_task = asyncio.create_task(self.rediscovery_loop())
+
+    def _unavailable_error(self):
+        retry_in = max(0, math.ceil(self.discovery_retry_at - time.monotonic()))
+        return LightUnavailableError(f"Light unavailable ({self.discovery_error}), retrying in {retry_in}s", retry_in)
+
+    async def rediscovery_loop(self):
+        """
+        Background task that retries discovery on the backoff schedule until lights are found,
+        then reapplies the latest light command.
+        """
+        while not self.lights:
+            await asyncio.sleep(max(0, (self.discovery_retry_at or 0) - time.monotonic()))
+            if not self.lights and not self.discovering:
+                self.start_discovery()
+            if self.discovering:
+                await asyncio.shield(self.ready)
+
+        print("Lights found again", file=sys.stderr)
+        await self.reapply_latest_request()
+
+    async def reapply_latest_request(self):
+        """Run the latest light command again, e.g. once lights are found or after a restart."""
+        request = self.latest_request
+        if request is None or not self.reapply_requests:
+            return
+
+        try:
+            if request['action'] == 'update_light':
+                await self.update_light(request['hasIssues'])
+            elif request['action'] == 'set_color':
+                await self.set_color(*validate_hsv(request['hue'], request['saturation'], request['value']))
+            elif request['action'] == 'turn_off':
+                await self.turn_off()
+        except Exception as e:
+            print(f"Couldn't reapply the latest light command: {e}", file=sys.stderr)
+
+    async def restore(self):
+        """
+        Bring the lights back to the journaled state as soon as they're found after a restart.
+
+        If the startup discovery fails, rediscovery_loop() reapplies the state instead.
+        """
+        if self.latest_request is None:
+            return
+        if self.discovering:
+            await asyncio.shield(self.ready)
+        if self.lights:
+            print(f"Restoring the journaled light state: {self.latest_request}", file=sys.stderr)
+            await self.reapply_latest_request()
+
+    def record_request(self, request):
+        """Remember the latest light command, in memory and in the journal. It replaces any animation."""
+        self.stop_animation()
+        self.latest_request = request
+        if request['action'] == 'update_light':
+            self.last_has_issues = request['hasIssues']
+
+        if self.journal.get('request') != request:
+            self.journal.update(has_issues=self.last_has_issues, request=request, requested_at=time.time())
+            save_journal(self.journal)
+
+    def record_applied(self, response):
+        """Journal the state a light command left the lights in."""
+        if response["superseded"]:
+            return
+
+        is_on = response.get("action", "on") == "on"
+        applied = {"is_on": is_on, "color": response.get("color") if is_on else None}
+        if self.journal.get('applied') != applied:
+            self.journal.update(applied=applied, applied_at=time.time())
+            save_journal(self.journal)
+
+    async def _discover_lights(self):
+        if self.host:
+            # Connect to specific host provided by user
+            print(f"Connecting to specified host: {self.host}", file=sys.stderr)
+            lights = [self._reuse_light(
+                self.host, None, None,
+                lambda: KasaLight(self.host, state_max_age=self.state_max_age, metrics=self.metrics)
+            )]
+            await lights[0].ensure_connected()
+        else:
+            # Connect straight to cached lights first
+            cached = load_cached_lights()
+            lights = [
+                self._reuse_light(
+                    entry['host'], entry.get('mac'), entry.get('port'),
+                    lambda entry=entry: KasaLight.from_cache(entry, state_max_age=self.state_max_age, metrics=self.metrics)
+                )
+                for entry in cached
+            ]
+            if lights:
+                print(f"Trying cached IPs: {', '.join(light.host for light in lights)}", file=sys.stderr)
+                results = await asyncio.gather(*(light.ensure_connected() for light in lights), return_exceptions=True)
+
+                for light, result in zip(lights, results):
+                    if isinstance(result, Exception):
+                        print(f"Failed to connect to cached IP {light.host}: {result}", file=sys.stderr)
+
+                # Lights that moved to a new IP are found again by MAC with one broadcast
+                missing = [light for light in lights if not light.device and light.mac]
+                if missing:
+                    await self._rediscover_by_mac(missing)
+
+                # Keep lights that are only temporarily unreachable; they reconnect on the next command
+                if any(light.device for light in lights):
+                    print(f"Successfully connected using cached IPs", file=sys.stderr)
+                    if [light.cache_entry() for light in lights] != cached:
+                        save_cached_lights([light.cache_entry() for light in lights])
+                else:
+                    print(f"Performing discovery...", file=sys.stderr)
+                    lights = []
+
+            # If nothing is cached or no cached light answered, do discovery
+            if not lights:
+                kasa = await load_kasa()
+                with self.metrics.timed("discovery.broadcast"):
+                    found_devices = await kasa.Discover.discover()
+                if len(found_devices) == 0:
+                    raise Exception("No devices found. Make sure your light is powered on, or run 'python punch-light-controller.py setup' to configure a new light.")
+
+                # Filter for lights only - check if device has Light module
+                devices = [d for d in found_devices.values() if kasa.Module.Light in d.modules]
+                if len(devices) == 0:
+                    raise Exception("No light devices found.")
+
+                lights = [
+                    self._reuse_light(
+                        d.host, d.mac, None,
+                        lambda d=d: KasaLight(d.host, d.alias, mac=d.mac, state_max_age=self.state_max_age,
+                                              metrics=self.metrics)
+                    )
+                    for d in devices
+                ]
+                results = await asyncio.gather(
+                    *(self._connect_discovered(light, device) for light, device in zip(lights, devices)),
+                    return_exceptions=True
+                )
+
+                errors = []
+                for light, result in zip(lights, results):
+                    if isinstance(result, Exception):
+                        print(f"Skipping {light.name}: {result}", file=sys.stderr)
+                        errors.append(f"{light.name}: {result}")
+                lights = [light for light in lights if light.device]
+                if not lights:
+                    raise Exception(f"No usable lights found. {'; '.join(errors)}")
+
+                # Save the discovered IPs to cache
+                save_cached_lights([light.cache_entry() for light in lights])
+
+        # Lights no longer in the group would otherwise keep their connections open
+        for light in self.lights:
+            if light not in lights:
+                await light._drop_connection()
+        self.lights = lights
+        return self.lights
+
+    def _reuse_light(self, host, mac, port, create):
+        """
+        The group's existing KasaLight for a bulb, or create() if it's new.
+
+        Reusing it keeps its open connection, command queue, degraded flag and keep-alive counters.
+        Bulbs are matched by MAC address, or by host and port if either MAC is unknown.
+        """
+        for light in self.lights:
+            if mac and light.mac:
+                if normalize_mac(light.mac) == normalize_mac(mac):
+                    return light
+            elif light.host == host and light.port == port:
+                return light
+        return create()
+
+    @staticmethod
+    async def _connect_discovered(light, device):
+        """Connect a light to the device a broadcast found for it, unless it's connected already."""
+        if light.device is None:
+            await light.connect(device)
+        else:
+            with contextlib.suppress(Exception):
+                await device.disconnect()
+
+    async def _rediscover_by_mac(self, lights):
+        """Broadcast once and reconnect any of the given lights whose MAC answers at a new IP."""
+        print(f"Looking for {', '.join(light.name for light in lights)} by MAC address...", file=sys.stderr)
+        kasa = await load_kasa()
+        with self.metrics.timed("discovery.broadcast"):
+            found_devices = await kasa.Discover.discover()
+        by_mac = {normalize_mac(device.mac): device for device in found_devices.values()}
+
+        matches = [(light, by_mac[normalize_mac(light.mac)]) for light in lights if normalize_mac(light.mac) in by_mac]
+        results = await asyncio.gather(
+            *(light.connect(device) for light, device in matches),
+            return_exceptions=True
+        )
+        for (light, device), result in zip(matches, results):
+            if isinstance(result, Exception):
+                print(f"Failed to connect to {light.name} at {device.host}: {result}", file=sys.stderr)
+
+    async def ensure_lights(self, timeout=READY_TIMEOUT):
+        """
+        Discover the light group if there isn't one yet, waiting on a discovery already in progress.
+
+        Every caller shares one background discovery, so a burst of commands never probes the
+        network more than once.
+
+        Raises:
+            LightUnavailableError: If discovery failed and is backing off
+            Exception: If the discovery in progress doesn't finish within timeout seconds
+        """
+        if not self.lights and not self.discovering:
+            if self.discovery_retry_at is not None:
+                raise self._unavailable_error()
+            self.start_discovery()
+
+        if self.discovering:
+            try:
+                # Shielded so a command that gives up doesn't cancel discovery for everyone else
+                await asyncio.wait_for(asyncio.shield(self.ready), timeout)
+            except asyncio.TimeoutError:
+                raise Exception(f"Lights not ready after {timeout}s, still discovering")
+
+        if not self.lights:
+            raise self._unavailable_error()
+
+    async def _ensure_lights_by(self, deadline):
+        """
+        ensure_lights(), giving up at the action's deadline.
+
+        Raises:
+            ActionTimeoutError: If the lights still aren't ready at the deadline
+        """
+        try:
+            async with asyncio.timeout_at(deadline):
+                await self.ensure_lights()
+        except TimeoutError:
+            raise ActionTimeoutError("Lights not ready before the deadline")
+
+    async def _fan_out(self, command, deadline):
+        """
+        Run command(light) on every light at once, each through that light's command queue.
+
+        A failing or hung light doesn't affect the others; its error is reported in its own result,
+        with an "error" code for timeouts and degraded lights.
+
+        Returns:
+            list: Per-light result dicts, in group order
+        """
+        lights = list(self.lights)
+        outcomes = await asyncio.gather(
+            *(light.submit(command, deadline) for light in lights),
+            return_exceptions=True
+        )
+
+        results = []
+        for light, outcome in zip(lights, outcomes):
+            if isinstance(outcome, BaseException):
+                error = {"status": "error", "message": str(outcome)}
+                if isinstance(outcome, (ActionTimeoutError, LightDegradedError)):
+                    error["error"] = outcome.error
+                outcome = error
+            results.append({**light.describe(), **outcome})
+
+        self.watch_degraded()
+        return results
 
-    async def discover_light(self):
-        """Discover a Kasa light on the network, using cached IP if available."""
-        if self.host:
-            # Connect to specific host provided by user
-            print(f"Connecting to specified host: {self.host}", file=sys.stderr)
-            self.device = await Discover.discover_single(self.host)
-        else:
-            # Try cached IP first
-            cached_ip = load_cached_ip()
-            if cached_ip:
-                try:
-                    print(f"Trying cached IP: {cached_ip}", file=sys.stderr)
-                    self.device = await Discover.discover_single(cached_ip)
-                    await self.device.update()
-
-                    # Verify it's still a light with Light module
-                    if Module.Light in self.device.modules:
-                        print(f"Successfully connected using cached IP", file=sys.stderr)
-                    else:
-                        # Cached device is not a light anymore, need to rediscover
-                        print(f"Cached device is not a light, rediscovering...", file=sys.stderr)
-                        self.device = None
-                except Exception as e:
-                    print(f"Failed to connect to cached IP: {e}", file=sys.stderr)
-                    print(f"Performing discovery...", file=sys.stderr)
-                    self.device = None
+    async def status(self, max_age=None, timeout=None):
+        """
+        Report what the lights are showing from tracked state, with no network traffic.
 
-            # If no cached IP or connection failed, do discovery
-            if not self.device:
-                found_devices = await Discover.discover()
-                if len(found_devices) == 0:
-                    raise Exception("No devices found. Make sure your light is powered on, or run 'python punch-light-controller.py setup' to configure a new light.")
-                elif len(found_devices) == 1:
-                    self.device = next(iter(found_devices.values()))
-                else:
-                    # Filter for lights only - check if device has Light module
-                    lights = [d for d in found_devices.values() if Module.Light in d.modules]
-                    if len(lights) == 0:
-                        raise Exception("No light devices found.")
-                    elif len(lights) == 1:
-                        self.device = lights[0]
-                    else:
-                        raise Exception(f"Multiple lights found. Please specify host IP.")
+        Args:
+            max_age: If set, lights whose state is unknown or older than this many seconds are
+                     re-read from the bulb first (discovering them if needed)
+            timeout: Seconds allowed for re-reading, defaulting to ACTION_TIMEOUTS['status']
+
+        Returns:
+            dict: The latest request and issue state, the journaled state, and each light's status
+        """
+        errors = {}
+        if max_age is not None:
+            deadline = action_deadline('status', timeout)
+            await self._ensure_lights_by(deadline)
+
+            # A light that can't be read keeps its last known state, with the error alongside
+            stale = [light for light in self.lights if not light.degraded and not light._state_is_fresh(max_age)]
+            outcomes = await asyncio.gather(
+                *(light.refresh_state(max_age, deadline) for light in stale),
+                return_exceptions=True
+            )
+            for light, outcome in zip(stale, outcomes):
+                if isinstance(outcome, Exception):
+                    errors[light] = {"status": "error", "message": str(outcome)}
+                    if isinstance(outcome, ActionTimeoutError):
+                        errors[light]["error"] = outcome.error
+
+            self.watch_degraded()
+
+        applied_at = self.journal.get('applied_at')
+        return {
+            "status": "ok",
+            "has_issues": self.last_has_issues,
+            "request": self.latest_request,
+            "animating": self.animation_task is not None and not self.animation_task.done(),
+            "discovering": self.discovering,
+            # What the last light command left the lights showing, kept across restarts
+            "applied": self.journal.get('applied'),
+            "applied_age_s": None if applied_at is None else round(time.time() - applied_at, 1),
+            "lights": [{**light.status(), **errors.get(light, {})} for light in self.lights]
+        }
 
-                # Save the discovered IP to cache
-                save_cached_ip(self.device.host)
+    def start_keepalive(self, interval):
+        """Start pinging the lights every interval seconds in the background."""
+        self.keepalive_interval = interval
+        self.keepalive_task = asyncio.create_task(self.keepalive_loop(interval))
 
-        await self.device.update()
+    async def keepalive_loop(self, interval):
+        """Background task that keeps every light's connection warm, leaving degraded ones to the health check."""
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.gather(*(light.keep_alive(interval) for light in self.lights if not light.degraded))
 
-        # Get the Light module and verify it has HSV support
-        if Module.Light not in self.device.modules:
-            raise Exception(f"Device {self.device.alias} is not a light.")
+    def keepalive_snapshot(self):
+        return {
+            "interval_s": self.keepalive_interval,
+            "lights": [{**light.describe(), **light.keepalive_stats()} for light in self.lights]
+        }
 
-        self.light = self.device.modules[Module.Light]
+    def watch_degraded(self):
+        """Start the background health check if any light is degraded and it isn't running yet."""
+        if any(light.degraded for light in self.lights) and (self.health_task is None or self.health_task.done()):
+            self.health_task = asyncio.create_task(self.health_check_loop())
 
-        if not self.light.has_feature("hsv"):
-            raise Exception(f"Light {self.device.alias} doesn't support HSV color control.")
+    async def health_check_loop(self):
+        """Background task that reconnects degraded lights until none are left."""
+        while any(light.degraded for light in self.lights):
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+            degraded = [light for light in self.lights if light.degraded]
+            await asyncio.gather(*(light.check_health() for light in degraded))
 
-        print(f"Connected to light: {self.device.alias} at {self.device.host}", file=sys.stderr)
-        return self.device.host
+    @staticmethod
+    def _group_response(results, **fields):
+        """
+        Combine per-light results into one response.
+
+        Raises:
+            LightDegradedError: If every light is degraded
+            ActionTimeoutError: If no light succeeded and at least one timed out
+            Exception: If no light in the group succeeded for any other reason
+        """
+        succeeded = [r for r in results if r["status"] == "ok"]
+        if not succeeded:
+            message = "; ".join(f"{r['alias'] or r['host']}: {r['message']}" for r in results)
+            errors = {r.get("error") for r in results}
+            if errors == {"degraded"}:
+                raise LightDegradedError(message)
+            if "timeout" in errors:
+                raise ActionTimeoutError(message)
+            raise Exception(message)
+
+        return {
+            "status": "ok",
+            **fields,
+            "changed": any(r.get("changed", False) for r in succeeded),
+            "superseded": all(r["superseded"] for r in succeeded),
+            "lights": results
+        }
 
-    def get_warning_color(self):
+    def get_warning_color(self, now=None):
         """
         Calculate the HSV color based on current time and warning urgency.
 
-        Returns tuple of (hue, saturation, value) where:
+        Args:
+            now: Local time to calculate the color for (defaults to now)
+
+        Returns tuple of (hue, saturation, value), or None if the light should be off.
+        With the default schedule:
         - Monday 5pm - Friday 9am: Gradient from yellow (60) to red (0)
         - All other periods: Bright red (0, 100, 100)
         """
-        now = datetime.datetime.now()
-        weekday = now.weekday()  # 0=Monday, 4=Friday, 5=Saturday, 6=Sunday
-        hour = now.hour
-
-        # Calculate the gradient period boundaries (Monday 5pm - Friday 9am)
-        monday_5pm = now.replace(hour=17, minute=0, second=0, microsecond=0)
-        monday_5pm -= datetime.timedelta(days=weekday)  # Go back to this week's Monday
-        friday_9am = monday_5pm + datetime.timedelta(days=4, hours=-8)  # 4 days - 8 hours = Friday 9am
+        if now is None:
+            now = datetime.datetime.now()
+        return self.schedule.color_at(now)
 
-        # Check if we're in the gradient period (Monday 5pm - Friday 9am)
-        if monday_5pm <= now < friday_9am:
-            # Calculate progression from yellow to red
-            total_duration = (friday_9am - monday_5pm).total_seconds()
-            elapsed = (now - monday_5pm).total_seconds()
-            progress = elapsed / total_duration
-            hue = int(60 * (1 - progress))  # Interpolate from yellow (60) to red (0)
-            return (hue, 100, 100)
-
-        return (0, 100, 100)
+    def next_color_change(self, now=None):
+        """Return the next time get_warning_color may return a different color, or None if never."""
+        if now is None:
+            now = datetime.datetime.now()
+        return self.schedule.next_change(now)
 
     async def periodic_update_loop(self):
-        """Background task that updates the light every 12 hours based on stored state."""
+        """
+        Background task that reapplies the stored state whenever the warning color changes.
+
+        It sleeps until the next color boundary instead of polling, and re-checks the wall clock
+        at least every SCHEDULER_MAX_SLEEP, so the light follows the gradient step by step
+        even across clock changes and suspend/resume.
+        """
         while True:
             try:
-                # Wait 12 hours
-                await asyncio.sleep(12 * 60 * 60)  # 12 hours in seconds
-
-                # Update light if we have a known state
-                if self.last_has_issues is not None:
-                    print(f"Periodic update (12h): has_issues={self.last_has_issues}", file=sys.stderr)
-                    await self.update_light(self.last_has_issues)
+                shown = self.get_warning_color()
+                resync_at = time.time() + RESYNC_INTERVAL
+
+                while self.get_warning_color() == shown and time.time() < resync_at:
+                    now = datetime.datetime.now()
+                    next_change = self.next_color_change(now)
+                    delay = (next_change - now).total_seconds() + COLOR_CHANGE_MARGIN if next_change else math.inf
+                    await asyncio.sleep(max(0, min(delay, resync_at - time.time(), SCHEDULER_MAX_SLEEP)))
+
+                # Reapply the latest command as is, so a manual color or off isn't replaced
+                # by the warning color. An animation reapplies it itself when it ends.
+                if self.latest_request is None:
+                    print("Scheduled update skipped: no light command yet", file=sys.stderr)
+                elif self.animation_task is not None and not self.animation_task.done():
+                    print("Scheduled update skipped: an animation is playing", file=sys.stderr)
                 else:
-                    print("Periodic update skipped: no punch data available yet", file=sys.stderr)
+                    print(f"Scheduled update: {self.latest_request}", file=sys.stderr)
+                    await self.reapply_latest_request()
 
             except Exception as e:
                 print(f"Error in periodic update loop: {e}", file=sys.stderr)
                 # Continue despite errors - don't break the loop
                 await asyncio.sleep(60)  # Wait a minute before retrying
 
-    async def update_light(self, has_issues):
+    async def update_light(self, has_issues, timeout=None):
         """
-        Update the light based on whether there are punch issues.
+        Update the lights based on whether there are punch issues.
 
         Args:
             has_issues: Boolean indicating if there are punch issues
+            timeout: Deadline in seconds, ACTION_TIMEOUTS['update_light'] by default
         """
-        if not self.device:
-            await self.discover_light()
-
-        await self.device.update()
-
-        if not self.device.is_on:
-            await self.device.turn_on()
+        deadline = action_deadline('update_light', timeout)
 
         # Store the current state for periodic updates
-        self.last_has_issues = has_issues
+        self.record_request({"action": "update_light", "hasIssues": has_issues})
+        await self._ensure_lights_by(deadline)
 
         if not has_issues:
-            # No issues - set to soft cool green
+            # No issues - set to soft cool green (or the schedule's no_issues color)
 
-            hue, saturation, value = 105, 60, 40
-            await self.light.set_hsv(hue, saturation, value)
-            await self.device.update()
+            hue, saturation, value = self.schedule.no_issues_color
+            response = self._group_response(
+                await self._fan_out(lambda light: light.apply_color(hue, saturation, value), deadline),
+                action="on",
+                color={"hue": hue, "saturation": saturation, "value": value},
+                mode="no_issues"
+            )
 
-            print(f"Light set to soft green (no issues): HSV({hue}, {saturation}, {value})", file=sys.stderr)
-            return {
-                "status": "ok",
-                "action": "on",
-                "color": {"hue": hue, "saturation": saturation, "value": value},
-                "mode": "no_issues"
-            }
+            if response["changed"]:
+                print(f"Light set to soft green (no issues): HSV({hue}, {saturation}, {value})", file=sys.stderr)
+            self.record_applied(response)
+            return response
 
         # There are issues - determine the color
         color = self.get_warning_color()
 
         if color is None:
-            if self.device.is_on:
-                await self.device.turn_off()
+            response = self._group_response(
+                await self._fan_out(lambda light: light.apply_off(), deadline),
+                action="off",
+                reason="light_off"
+            )
+            if response["changed"]:
                 print("Light turned off", file=sys.stderr)
-            return {"status": "ok", "action": "off", "reason": "light_off"}
+            self.record_applied(response)
+            return response
 
         # Set color using the Light module
         hue, saturation, value = color
-        await self.light.set_hsv(hue, saturation, value)
-        await self.device.update()
+        response = self._group_response(
+            await self._fan_out(lambda light: light.apply_color(hue, saturation, value), deadline),
+            action="on",
+            color={"hue": hue, "saturation": saturation, "value": value}
+        )
 
-        print(f"Light set to HSV({hue}, {saturation}, {value})", file=sys.stderr)
-        return {
-            "status": "ok",
-            "action": "on",
-            "color": {"hue": hue, "saturation": saturation, "value": value}
-        }
+        if response["changed"]:
+            print(f"Light set to HSV({hue}, {saturation}, {value})", file=sys.stderr)
+        self.record_applied(response)
+        return response
 
-    async def set_color(self, hue, saturation, value):
-        """Manually set the light to a specific HSV color."""
-        if not self.device:
-            await self.discover_light()
+    def stop_animation(self):
+        if self.animation_task is not None and not self.animation_task.done():
+            self.animation_task.cancel()
+            print("Animation stopped by a newer light command", file=sys.stderr)
+        self.animation_task = None
+
+    async def animate(self, keyframes, repeat=1, restore=True, wait=False, timeout=None):
+        """
+        Play keyframes on the lights, one write per keyframe; IOT bulbs run the transitions themselves,
+        and the others are faded in steps.
 
-        await self.device.update()
+        Args:
+            keyframes, repeat: As returned by parse_animation()
+            restore: Reapply the latest light command when the animation ends
+            wait: Respond when the animation ends instead of once it has started
+            timeout: Deadline in seconds for the lights to be ready and for each keyframe write
+        """
+        deadline = action_deadline('animate', timeout)
+        await self._ensure_lights_by(deadline)
 
-        if not self.device.is_on:
-            await self.device.turn_on()
+        self.stop_animation()
+        self.animation_task = asyncio.create_task(self._play(keyframes, repeat, restore, timeout))
 
-        await self.light.set_hsv(hue, saturation, value)
-        await self.device.update()
+        duration = repeat * sum(keyframe["transition"] + keyframe["hold"] for keyframe in keyframes)
+        print(f"Animating {len(keyframes)} keyframe(s) x {repeat} over {duration:g}s", file=sys.stderr)
+        task = self.animation_task
+        if wait:
+            # asyncio.wait doesn't raise if a newer light command cancels the animation
+            await asyncio.wait([task])
 
-        print(f"Light manually set to HSV({hue}, {saturation}, {value})", file=sys.stderr)
         return {
             "status": "ok",
-            "color": {"hue": hue, "saturation": saturation, "value": value}
+            "stopped": task.cancelled(),
+            "keyframes": len(keyframes),
+            "repeat": repeat,
+            "duration_s": round(duration, 3),
+            "lights": [light.describe() for light in self.lights]
         }
 
-    async def turn_off(self):
-        """Turn off the light."""
-        if not self.device:
-            await self.discover_light()
+    async def _play(self, keyframes, repeat, restore, timeout):
+        """Background task that writes each keyframe on schedule, then optionally restores the light."""
+        loop = asyncio.get_running_loop()
+        next_at = loop.time()
+
+        async def write(command):
+            for result in await self._fan_out(command, action_deadline('animate', timeout)):
+                if result["status"] == "error":
+                    print(f"Animation keyframe failed on {result['alias'] or result['host']}: {result['message']}",
+                          file=sys.stderr)
+
+        try:
+            for _ in range(repeat):
+                for keyframe in keyframes:
+                    await write(lambda light: light.apply_keyframe(keyframe))
+
+                    # Bulbs that ignore transitions are faded a step every FADE_STEP_INTERVAL
+                    if keyframe["transition"] and keyframe["effect"] is None and not all(
+                            light.iot for light in self.lights):
+                        steps = math.ceil(keyframe["transition"] / FADE_STEP_INTERVAL)
+                        for step in range(1, steps + 1):
+                            await asyncio.sleep(max(0, next_at + keyframe["transition"] * step / steps - loop.time()))
+                            await write(lambda light: light.apply_fade_step(keyframe, step / steps))
+
+                    # Sleep through the transition and hold; the bulb needs nothing more until then
+                    next_at += keyframe["transition"] + keyframe["hold"]
+                    await asyncio.sleep(max(0, next_at - loop.time()))
+
+            if any(keyframe["effect"] for keyframe in keyframes):
+                await self._fan_out(lambda light: light.stop_effect(), action_deadline('animate', timeout))
+        except Exception as e:
+            print(f"Animation failed: {e}", file=sys.stderr)
+
+        self.animation_task = None
+        if restore:
+            await self.reapply_latest_request()
+
+    async def set_color(self, hue, saturation, value, timeout=None):
+        """Manually set the lights to a specific HSV color."""
+        deadline = action_deadline('set_color', timeout)
+        self.record_request({"action": "set_color", "hue": hue, "saturation": saturation, "value": value})
+        await self._ensure_lights_by(deadline)
 
-        await self.device.update()
+        response = self._group_response(
+            await self._fan_out(lambda light: light.apply_color(hue, saturation, value), deadline),
+            color={"hue": hue, "saturation": saturation, "value": value}
+        )
+
+        if response["changed"]:
+            print(f"Light manually set to HSV({hue}, {saturation}, {value})", file=sys.stderr)
+        self.record_applied(response)
+        return response
 
-        if self.device.is_on:
-            await self.device.turn_off()
+    async def turn_off(self, timeout=None):
+        """Turn off the lights."""
+        deadline = action_deadline('turn_off', timeout)
+        self.record_request({"action": "turn_off"})
+        await self._ensure_lights_by(deadline)
+
+        response = self._group_response(
+            await self._fan_out(lambda light: light.apply_off(), deadline),
+            action="off"
+        )
 
-        print("Light turned off", file=sys.stderr)
-        return {"status": "ok", "action": "off"}
+        if response["changed"]:
+            print("Light turned off", file=sys.stderr)
+        self.record_applied(response)
+        return response
 
 
 # Constants for validation
 MAX_MESSAGE_SIZE = 1024 * 1024  # 1MB max message size to prevent DoS
-ALLOWED_ACTIONS = {'update_light', 'set_color', 'turn_off', 'discover'}
+ALLOWED_ACTIONS = {'update_light', 'set_color', 'turn_off', 'animate', 'discover', 'stats', 'status'}
+MAX_BATCH_SIZE = 32  # Most actions accepted in one batch message
 
 # HSV validation ranges
 HSV_HUE_MIN = 0
@@ -380,59 +2095,177 @@ def validate_hsv(hue, saturation, value):
 
 
 # Native messaging functions for browser extension
-def get_message():
+def validate_timeout(timeout):
     """
-    Read a message from stdin (from extension).
+    Validate an action timeout from a message.
 
     Returns:
-        dict: Parsed JSON message from browser extension
-        None: If no message available (EOF)
+        float: The timeout in seconds
 
     Raises:
-        ValueError: If message is too large (potential DoS attack)
-        json.JSONDecodeError: If message is not valid JSON
+        ValueError: If it isn't a number in (0, MAX_ACTION_TIMEOUT]
     """
-    raw_length = sys.stdin.buffer.read(4)
-    if not raw_length:
-        return None
+    if isinstance(timeout, bool) or not isinstance(timeout, (int, float)):
+        raise ValueError(f"Invalid timeout: must be a number, got {type(timeout).__name__}")
+    if not 0 < timeout <= MAX_ACTION_TIMEOUT:
+        raise ValueError(f"Invalid timeout: must be greater than 0 and at most {MAX_ACTION_TIMEOUT}, got {timeout}")
+    return float(timeout)
+
+
+class MessageFramingError(ValueError):
+    """A native message frame was malformed, so the stream position can no longer be trusted."""
+
+
+def parse_message_length(raw_length):
+    """
+    Decode and validate the 4-byte length prefix of a native message.
+
+    Raises:
+        MessageFramingError: If the prefix is truncated, the message is empty, or too large
+    """
+    if len(raw_length) != 4:
+        raise MessageFramingError(f"Truncated message header: got {len(raw_length)} of 4 bytes")
 
     message_length = struct.unpack('=I', raw_length)[0]
 
     if message_length > MAX_MESSAGE_SIZE:
-        raise ValueError(
+        raise MessageFramingError(
             f"Message too large: {message_length} bytes "
             f"(max allowed: {MAX_MESSAGE_SIZE} bytes). "
         )
 
     if message_length == 0:
-        raise ValueError("Empty message received")
+        raise MessageFramingError("Empty message received")
 
-    message = sys.stdin.buffer.read(message_length).decode('utf-8')
-    return json.loads(message)
+    return message_length
 
 
-def send_message(message):
-    """Send a message to stdout (to extension)."""
+def encode_message(message):
+    """Encode a message as a length-prefixed native messaging frame."""
     encoded_message = json.dumps(message).encode('utf-8')
     encoded_length = struct.pack('=I', len(encoded_message))
-    sys.stdout.buffer.write(encoded_length)
-    sys.stdout.buffer.write(encoded_message)
+    return encoded_length + encoded_message
+
+
+def send_message(message):
+    """Send a message to stdout (to extension)."""
+    sys.stdout.buffer.write(encode_message(message))
     sys.stdout.buffer.flush()
 
 
+async def open_stdin_reader():
+    """
+    Wrap stdin in an asyncio StreamReader so waiting for the browser never blocks the event loop.
+
+    Pipes and sockets (what browsers hand to native hosts) are attached to the loop directly.
+    Anything else (a terminal or a redirected file) is read by a daemon thread that feeds the
+    reader, since putting those in non-blocking mode would also affect stdout/stderr.
+    """
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=MAX_MESSAGE_SIZE + 4, loop=loop)
+
+    mode = os.fstat(sys.stdin.fileno()).st_mode
+    if stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode):
+        protocol = asyncio.StreamReaderProtocol(reader, loop=loop)
+        await loop.connect_read_pipe(lambda: protocol, sys.stdin.buffer)
+        return reader
+
+    def pump():
+        try:
+            while True:
+                chunk = sys.stdin.buffer.read1(65536)
+                if not chunk:
+                    break
+                loop.call_soon_threadsafe(reader.feed_data, chunk)
+        except Exception as e:
+            print(f"Error reading stdin: {e}", file=sys.stderr)
+        finally:
+            loop.call_soon_threadsafe(reader.feed_eof)
+
+    threading.Thread(target=pump, name="stdin-reader", daemon=True).start()
+    return reader
+
+
+async def read_message(reader):
+    """
+    Read a message from an asyncio StreamReader without blocking the event loop.
+
+    Returns:
+        dict | list: Parsed JSON message (or batch) from browser extension
+        None: If the extension closed the stream (EOF)
+
+    Raises:
+        MessageFramingError: If the frame is truncated, empty or too large
+        json.JSONDecodeError: If message is not valid JSON
+    """
+    try:
+        raw_length = await reader.readexactly(4)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raw_length = e.partial
+
+    message_length = parse_message_length(raw_length)
+
+    try:
+        message = await reader.readexactly(message_length)
+    except asyncio.IncompleteReadError as e:
+        raise MessageFramingError(f"Truncated message: got {len(e.partial)} of {message_length} bytes")
+
+    return json.loads(message.decode('utf-8'))
+
+
+class MessageWriter:
+    """
+    Writes native messaging frames to stdout from a worker thread.
+
+    A browser that is slow to drain its end of the pipe would otherwise block the event
+    loop inside send_message. The lock keeps frames from concurrent tasks from interleaving.
+    """
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+
+    async def send(self, message):
+        async with self._lock:
+            await asyncio.to_thread(send_message, message)
+
+
 async def handle_message(controller, message):
     """
     Handle a message from the extension.
 
+    A message is either one action or a batch: a list of actions that are run concurrently.
+    An action may carry an 'id' of any JSON type, which is echoed in its response so the
+    extension can match responses to requests when they arrive out of order.
+
     Args:
         controller: PunchLightController instance
-        message: dict containing action and parameters
+        message: dict containing action and parameters, or a list of them
 
     Returns:
         dict: Response message with status and results
+        list: For a batch, one response per action in request order
+    """
+    if isinstance(message, list):
+        if len(message) > MAX_BATCH_SIZE:
+            # One error per action, with its id, so the extension can fail each call
+            error = {"status": "error", "message": f"Batch too large: {len(message)} actions (max allowed: {MAX_BATCH_SIZE})"}
+            return [{**error, "id": item['id']} if isinstance(item, dict) and 'id' in item else error for item in message]
+        return list(await asyncio.gather(*(handle_action(controller, item) for item in message)))
 
-    Raises:
-        ValueError: If message format is invalid or action is not allowed
+    return await handle_action(controller, message)
+
+
+async def handle_action(controller, message):
+    """
+    Handle a single action message.
+
+    Its latency is recorded as 'action.<name>' unless the message has "recordLatency": false, which
+    monitors polling the controller use so their reads don't fill up every client's stats.
+
+    Returns:
+        dict: Response message with status and results, and the message's 'id' if it had one
     """
     if not isinstance(message, dict):
         return {"status": "error", "message": "Invalid message format: must be a JSON object"}
@@ -440,14 +2273,35 @@ async def handle_message(controller, message):
     action = message.get('action')
 
     if not action:
-        return {"status": "error", "message": "Missing 'action' field in message"}
+        response = {"status": "error", "message": "Missing 'action' field in message"}
 
-    if action not in ALLOWED_ACTIONS:
-        return {
+    elif action not in ALLOWED_ACTIONS:
+        response = {
             "status": "error",
             "message": f"Invalid action: '{action}'. Allowed actions: {', '.join(sorted(ALLOWED_ACTIONS))}"
         }
 
+    else:
+        started = time.perf_counter()
+        response = await run_allowed_action(controller, action, message)
+        if message.get('recordLatency') is not False:
+            controller.metrics.record(f"action.{action}", time.perf_counter() - started,
+                                      error=response["status"] == "error")
+
+    if 'id' in message:
+        response = {**response, "id": message['id']}
+    return response
+
+
+async def run_allowed_action(controller, action, message):
+    """Validate the parameters of an allowed action and run it, returning a response dict."""
+    timeout = ACTION_TIMEOUTS.get(action)
+    if 'timeout' in message and timeout is not None:
+        try:
+            timeout = validate_timeout(message['timeout'])
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+
     # Handle each action with appropriate validation
     try:
         if action == 'update_light':
@@ -460,7 +2314,7 @@ async def handle_message(controller, message):
                     "message": f"Invalid hasIssues value: must be boolean, got {type(has_issues).__name__}"
                 }
 
-            result = await controller.update_light(has_issues)
+            result = await controller.update_light(has_issues, timeout=timeout)
             return result
 
         elif action == 'set_color':
@@ -473,16 +2327,73 @@ async def handle_message(controller, message):
             except ValueError as e:
                 return {"status": "error", "message": str(e)}
 
-            result = await controller.set_color(hue, saturation, value)
+            result = await controller.set_color(hue, saturation, value, timeout=timeout)
             return result
 
         elif action == 'turn_off':
-            result = await controller.turn_off()
+            result = await controller.turn_off(timeout=timeout)
             return result
 
+        elif action == 'animate':
+            try:
+                keyframes, repeat = parse_animation(message)
+            except ValueError as e:
+                return {"status": "error", "message": str(e)}
+
+            restore = message.get('restore', True)
+            wait = message.get('wait', False)
+            if not isinstance(restore, bool) or not isinstance(wait, bool):
+                return {"status": "error", "message": "Invalid restore or wait value: must be boolean"}
+
+            return await controller.animate(keyframes, repeat, restore=restore, wait=wait, timeout=timeout)
+
         elif action == 'discover':
-            host = await controller.discover_light()
-            return {"status": "ok", "host": host, "alias": controller.device.alias}
+            if controller.discovering:
+                # Answer at once; the startup discovery is already looking
+                return {"status": "ok", "discovering": True, "host": None, "alias": None, "lights": []}
+
+            try:
+                async with asyncio.timeout(timeout):
+                    lights = await controller.discover_lights()
+            except TimeoutError:
+                raise ActionTimeoutError("Discovery didn't finish before the deadline")
+            return {
+                "status": "ok",
+                "host": lights[0].host,
+                "alias": lights[0].alias,
+                "lights": [light.describe() for light in lights]
+            }
+
+        elif action == 'status':
+            max_age = message.get('maxAge')
+            if max_age is not None and (isinstance(max_age, bool) or not isinstance(max_age, (int, float)) or max_age < 0):
+                return {"status": "error", "message": f"Invalid maxAge: {max_age!r} (must be a number of seconds, 0 or more)"}
+
+            return await controller.status(max_age, timeout=timeout)
+
+        elif action == 'stats':
+            return {
+                "status": "ok",
+                "stats": controller.metrics.snapshot(),
+                "keepalive": controller.keepalive_snapshot(),
+                "startup": startup_snapshot()
+            }
+
+    except LightUnavailableError as e:
+        return {
+            "status": "error",
+            "error": e.error,
+            "retry_in": e.retry_in,
+            "message": f"Error executing action '{action}': {str(e)}"
+        }
+
+    except (ActionTimeoutError, LightDegradedError) as e:
+        return {
+            "status": "error",
+            "error": e.error,
+            "timeout": timeout,
+            "message": f"Error executing action '{action}': {str(e)}"
+        }
 
     except Exception as e:
         return {
@@ -491,36 +2402,337 @@ async def handle_message(controller, message):
         }
 
 
-async def main_native_messaging():
-    """Main loop for native messaging with browser extension."""
+async def start_controller(scheduler=True):
+    """
+    Create a controller and start its background tasks.
+
+    Returns without waiting for the lights, so messages can be served while they're being
+    discovered.
+
+    Args:
+        scheduler: Restore the journaled light command, reapply it when the lights are found
+                   again and keep the warning color up to date. Team mode drives the lights
+                   itself, so it turns this off.
+    """
     controller = PunchLightController()
+    controller.reapply_requests = scheduler
+    controller.start_discovery()
+
+    if scheduler:
+        # Put the light back the way the last run left it, without waiting for the browser
+        controller.restore_task = asyncio.create_task(controller.restore())
+
+        # Start periodic update task in background
+        controller.periodic_task = asyncio.create_task(controller.periodic_update_loop())
+        print("Started color scheduler", file=sys.stderr)
+
+    # Optionally dump latency stats to a file for monitoring
+    stats_interval = os.environ.get('PUNCH_LIGHT_STATS_INTERVAL')
+    if stats_interval:
+        try:
+            controller.stats_task = asyncio.create_task(controller.metrics.dump_loop(STATS_FILE, float(stats_interval)))
+            print(f"Dumping stats to {STATS_FILE} every {stats_interval}s", file=sys.stderr)
+        except ValueError:
+            print(f"Warning: Invalid PUNCH_LIGHT_STATS_INTERVAL: {stats_interval!r}", file=sys.stderr)
 
-    # Try to discover light on startup
+    # Keep the light connections warm between messages
+    keepalive_interval = os.environ.get('PUNCH_LIGHT_KEEPALIVE_INTERVAL', str(KEEPALIVE_INTERVAL))
     try:
-        await controller.discover_light()
-    except Exception as e:
-        print(f"Warning: Could not discover light on startup: {e}", file=sys.stderr)
+        if float(keepalive_interval) > 0:
+            controller.start_keepalive(float(keepalive_interval))
+            print(f"Pinging lights every {keepalive_interval}s", file=sys.stderr)
+    except ValueError:
+        print(f"Warning: Invalid PUNCH_LIGHT_KEEPALIVE_INTERVAL: {keepalive_interval!r}", file=sys.stderr)
+
+    return controller
+
+
+# Controller daemon: one long-lived process owns the lights and serves the CLI and native hosts
+class DaemonUnavailableError(Exception):
+    """The controller daemon isn't running or stopped answering."""
+
+
+async def write_frame(writer, message):
+    """Write a length-prefixed message to an asyncio StreamWriter."""
+    writer.write(encode_message(message))
+    await writer.drain()
+
+
+async def request_daemon(message):
+    """
+    Send one message to the controller daemon and wait for its response.
+
+    Each request uses its own connection, so concurrent requests never need to be matched
+    up with their responses.
+
+    Raises:
+        DaemonUnavailableError: If the daemon isn't running or dropped the connection
+    """
+    try:
+        reader, writer = await asyncio.open_unix_connection(str(SOCKET_PATH), limit=MAX_MESSAGE_SIZE + 4)
+    except OSError as e:
+        raise DaemonUnavailableError(f"Controller daemon not available: {e}")
+
+    try:
+        await write_frame(writer, message)
+        response = await read_message(reader)
+    except (OSError, MessageFramingError) as e:
+        raise DaemonUnavailableError(f"Lost connection to controller daemon: {e}")
+    finally:
+        writer.close()
+
+    if response is None:
+        raise DaemonUnavailableError("Controller daemon closed the connection")
+    return response
+
+
+async def daemon_is_running():
+    """Check whether a controller daemon is accepting connections."""
+    try:
+        _, writer = await asyncio.open_unix_connection(str(SOCKET_PATH))
+    except OSError:
+        return False
+    writer.close()
+    return True
+
+
+class DaemonConnection:
+    """
+    One connection to the controller daemon that carries many requests at once.
+
+    Requests are written back to back without waiting for responses. The daemon sends each
+    response when it's ready, and they're matched to their requests by 'id'.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pending = {}  # id -> future for the response
+        self.receiver = asyncio.create_task(self._receive())
+
+    @classmethod
+    async def open(cls):
+        """
+        Raises:
+            DaemonUnavailableError: If the daemon isn't running
+        """
+        try:
+            reader, writer = await asyncio.open_unix_connection(str(SOCKET_PATH), limit=MAX_MESSAGE_SIZE + 4)
+        except OSError as e:
+            raise DaemonUnavailableError(f"Controller daemon not available: {e}")
+        return cls(reader, writer)
+
+    async def send(self, message, message_id):
+        """Write a message and return a future for the response carrying message_id."""
+        future = asyncio.get_running_loop().create_future()
+        if self.receiver.done():
+            future.set_exception(DaemonUnavailableError("Lost connection to controller daemon"))
+            return future
+
+        self.pending[message_id] = future
+        try:
+            await write_frame(self.writer, message)
+        except OSError as e:
+            self.pending.pop(message_id, None)
+            future.set_exception(DaemonUnavailableError(f"Lost connection to controller daemon: {e}"))
+        return future
+
+    async def _receive(self):
+        try:
+            while True:
+                response = await read_message(self.reader)
+                if response is None:
+                    error = "Controller daemon closed the connection"
+                    break
+                first = response[0] if isinstance(response, list) and response else response
+                future = self.pending.pop(first.get("id"), None) if isinstance(first, dict) else None
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except (OSError, MessageFramingError, json.JSONDecodeError) as e:
+            error = f"Lost connection to controller daemon: {e}"
+
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(DaemonUnavailableError(error))
+        self.pending.clear()
+
+    def close(self):
+        self.receiver.cancel()
+        self.writer.close()
+
+
+async def start_daemon_server(controller):
+    """
+    Serve ALLOWED_ACTIONS on SOCKET_PATH with the given controller.
+
+    The caller checks that no daemon is running first, and removes SOCKET_PATH when done.
+    """
+    # Nothing is listening, so any socket file left behind is stale
+    SOCKET_PATH.unlink(missing_ok=True)
+
+    async def serve_client(reader, writer):
+        write_lock = asyncio.Lock()
+        in_flight = set()
+
+        async def respond(message):
+            result = await handle_message(controller, message)
+            async with write_lock:
+                await write_frame(writer, result)
+
+        try:
+            while True:
+                message = await read_message(reader)
+                if message is None:
+                    break
+
+                task = asyncio.create_task(respond(message))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+
+        except (MessageFramingError, json.JSONDecodeError) as e:
+            async with write_lock:
+                await write_frame(writer, {"status": "error", "message": str(e)})
+
+        except OSError as e:
+            print(f"Daemon client error: {e}", file=sys.stderr)
+
+        finally:
+            if in_flight:
+                await asyncio.gather(*in_flight, return_exceptions=True)
+            writer.close()
+
+    # Only this user may connect to the socket
+    old_umask = os.umask(0o077)
+    try:
+        return await asyncio.start_unix_server(serve_client, path=str(SOCKET_PATH), limit=MAX_MESSAGE_SIZE + 4)
+    finally:
+        os.umask(old_umask)
+
+
+async def main_daemon():
+    """Serve ALLOWED_ACTIONS over a Unix domain socket, holding the light connections open."""
+    if await daemon_is_running():
+        print(f"Controller daemon already running at {SOCKET_PATH}", file=sys.stderr)
+        sys.exit(1)
+
+    controller = await start_controller()
+    server = await start_daemon_server(controller)
+
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    print(f"Controller daemon listening on {SOCKET_PATH}", file=sys.stderr)
+
+    try:
+        async with server:
+            await server.serve_forever()
+    except asyncio.CancelledError:
+        print("Controller daemon stopping", file=sys.stderr)
+    finally:
+        SOCKET_PATH.unlink(missing_ok=True)
+        controller.stop()
+
+
+async def main_native_messaging():
+    """
+    Main loop for native messaging with browser extension.
+
+    If the controller daemon is running, messages are forwarded to it so that every browser
+    shares one connection to the lights. Otherwise this process controls the lights itself.
+    """
+    controller = None
+    controller_lock = asyncio.Lock()
+
+    async def get_controller():
+        nonlocal controller
+        async with controller_lock:
+            if controller is None:
+                controller = await start_controller()
+        return controller
+
+    # Open stdin first so the browser's first message is read as soon as anything can answer it
+    reader = await open_stdin_reader()
+    record_startup('stdin_open')
+
+    use_daemon = await daemon_is_running()
+    if use_daemon:
+        print(f"Forwarding messages to controller daemon at {SOCKET_PATH}", file=sys.stderr)
+    else:
+        await get_controller()
+
+    async def dispatch(message):
+        nonlocal use_daemon
+        if use_daemon:
+            try:
+                return await request_daemon(message)
+            except DaemonUnavailableError as e:
+                print(f"{e}; controlling the light directly", file=sys.stderr)
+                use_daemon = False
+        return await handle_message(await get_controller(), message)
 
-    # Start periodic update task in background
-    controller.periodic_task = asyncio.create_task(controller.periodic_update_loop())
-    print("Started periodic update task (12h interval)", file=sys.stderr)
+    writer = MessageWriter()
+
+    # Messages are handled as concurrent tasks so reading never waits on the light, and the
+    # command queue can collapse bursts that arrive while a command is in flight. Responses are
+    # sent as soon as they're ready, possibly out of order; the extension matches them by 'id'.
+    in_flight = set()
+
+    async def respond(message):
+        try:
+            started = time.perf_counter()
+            result = await dispatch(message)
+            await writer.send(result)
+            record_startup('first_response')
+            if controller is not None:
+                controller.metrics.record("native.message", time.perf_counter() - started,
+                                          error=isinstance(result, dict) and result.get("status") == "error")
+        except Exception as e:
+            print(f"Error sending response: {e}", file=sys.stderr)
 
     # Process messages from browser
     while True:
         try:
-            message = get_message()
+            message = await read_message(reader)
             if message is None:
                 break
 
+            record_startup('first_message')
             print(f"Received message: {message}", file=sys.stderr)
 
-            result = await handle_message(controller, message)
-            send_message(result)
+            task = asyncio.create_task(respond(message))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+        except MessageFramingError as e:
+            # A bad frame leaves the stream position unknown, so stop reading
+            print(f"Error: {e}", file=sys.stderr)
+            await writer.send({"status": "error", "message": str(e)})
+            break
 
         except Exception as e:
             error_msg = {"status": "error", "message": str(e)}
             print(f"Error: {e}", file=sys.stderr)
-            send_message(error_msg)
+            await writer.send(error_msg)
+
+    # Let commands already received finish and reply before exiting
+    if in_flight:
+        await asyncio.gather(*in_flight, return_exceptions=True)
+
+    if controller is not None:
+        controller.stop()
+
+
+async def run_action(message):
+    """Run one action through the controller daemon, or directly if it isn't running."""
+    try:
+        return await request_daemon(message)
+    except DaemonUnavailableError:
+        return await handle_message(PunchLightController(), message)
+
+
+def print_result(result):
+    """Print an action's response for the CLI, exiting with status 1 if the action failed."""
+    print(json.dumps(result, indent=2))
+    if result.get("status") != "ok":
+        sys.exit(1)
 
 
 async def main_cli():
@@ -532,7 +2744,11 @@ async def main_cli():
         print("  python punch-light-controller.py update <has_issues>")
         print("  python punch-light-controller.py set <hue> <sat> <val>")
         print("  python punch-light-controller.py off")
+        print("  python punch-light-controller.py animate <fade|pulse|flash> <hue> <sat> <val> [seconds] [repeat]")
+        print("  python punch-light-controller.py status [max_age]  # What the light is showing")
+        print("  python punch-light-controller.py stats      # Show action and device call latencies")
         print("  python punch-light-controller.py native     # Run in native messaging mode")
+        print("  python punch-light-controller.py daemon     # Keep the light connected and serve other commands")
         return
 
     command = sys.argv[1]
@@ -541,17 +2757,21 @@ async def main_cli():
         await connect_light_to_wifi()
         return
 
-    controller = PunchLightController()
-
     if command == 'discover':
-        host = await controller.discover_light()
-        print(f"Found light at {host}")
-        print(f"Alias: {controller.device.alias}")
+        result = await run_action({"action": "discover"})
+        if result["status"] != "ok":
+            print(f"Error: {result['message']}", file=sys.stderr)
+            sys.exit(1)
+        if result.get("discovering"):
+            print("The controller daemon is still discovering lights; try again in a moment")
+        for light in result["lights"]:
+            print(f"Found light at {light['host']}")
+            print(f"Alias: {light['alias']}")
 
     elif command == 'update':
         has_issues = sys.argv[2].lower() in ('true', '1', 'yes') if len(sys.argv) > 2 else False
-        result = await controller.update_light(has_issues)
-        print(json.dumps(result, indent=2))
+        result = await run_action({"action": "update_light", "hasIssues": has_issues})
+        print_result(result)
 
     elif command == 'set':
         try:
@@ -560,21 +2780,62 @@ async def main_cli():
             val = int(sys.argv[4]) if len(sys.argv) > 4 else 100
 
             hue, sat, val = validate_hsv(hue, sat, val)
-
-            result = await controller.set_color(hue, sat, val)
-            print(json.dumps(result, indent=2))
         except ValueError as e:
             print(f"Error: {e}", file=sys.stderr)
             print(f"Usage: python punch-light-controller.py set <hue(0-360)> <saturation(0-100)> <value(0-100)>", file=sys.stderr)
             sys.exit(1)
 
+        result = await run_action({"action": "set_color", "hue": hue, "saturation": sat, "value": val})
+        print_result(result)
+
     elif command == 'off':
-        result = await controller.turn_off()
-        print(json.dumps(result, indent=2))
+        result = await run_action({"action": "turn_off"})
+        print_result(result)
+
+    elif command == 'animate':
+        try:
+            preset = sys.argv[2]
+            hue, sat, val = validate_hsv(*sys.argv[3:6])
+            duration = float(sys.argv[6]) if len(sys.argv) > 6 else 2
+            repeat = int(sys.argv[7]) if len(sys.argv) > 7 else 1
+        except (IndexError, TypeError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            print("Usage: python punch-light-controller.py animate <fade|pulse|flash> <hue> <sat> <val> [seconds] [repeat]",
+                  file=sys.stderr)
+            sys.exit(1)
+
+        # Wait for the end, or this process would exit and stop the animation
+        result = await run_action({
+            "action": "animate",
+            "preset": preset,
+            "color": {"hue": hue, "saturation": sat, "value": val},
+            "duration": duration,
+            "repeat": repeat,
+            "wait": True
+        })
+        print_result(result)
+
+    elif command == 'status':
+        message = {"action": "status"}
+        if len(sys.argv) > 2:
+            try:
+                message["maxAge"] = float(sys.argv[2])
+            except ValueError:
+                print("Usage: python punch-light-controller.py status [max_age_seconds]", file=sys.stderr)
+                sys.exit(1)
+        result = await run_action(message)
+        print_result(result)
+
+    elif command == 'stats':
+        result = await run_action({"action": "stats"})
+        print_result(result)
 
     elif command == 'native':
         await main_native_messaging()
 
+    elif command == 'daemon':
+        await main_daemon()
+
     else:
         print(f"Unknown command: {command}")
 
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Punch-Up Light Dashboard
+Serves a local web page showing the lights, the upcoming warning colors and latencies, updated live.
+
+The page reads the controller daemon's state when it's running. Otherwise this process runs the
+controller from punch-light-controller.py and serves the daemon socket itself.
+"""
+
+import argparse
+import asyncio
+import colorsys
+import contextlib
+import datetime
+import itertools
+import signal
+import sys
+
+try:
+    import uvicorn
+    from fastapi import FastAPI
+    from nicegui import ui
+except ImportError:
+    print("Error: the dashboard needs NiceGUI; install the Pipfile's packages with 'pipenv install'", file=sys.stderr)
+    sys.exit(1)
+
+from load_controller import load_controller
+
+punch_light = load_controller()
+
+DASHBOARD_PORT = 8080
+DASHBOARD_REFRESH = 1  # Seconds between reads of the controller's tracked state, which never reach the bulbs
+DASHBOARD_SCHEDULE_ROWS = 12  # Upcoming color changes listed
+DASHBOARD_SCHEDULE_HORIZON = datetime.timedelta(days=7)  # How far ahead they're looked for
+DASHBOARD_OPERATIONS = ('action.', 'device.')  # Latency histograms listed, by name prefix
+DASHBOARD_OFF_RGB = (32, 32, 32)  # How 'off' is drawn
+
+
+def css_color(color):
+    """A bulb color tuple (or None for off) as a CSS hex color, off drawn as DASHBOARD_OFF_RGB."""
+    if color is None:
+        return '#%02x%02x%02x' % DASHBOARD_OFF_RGB
+    hue, saturation, value = color
+    return '#%02x%02x%02x' % tuple(
+        round(channel * 255) for channel in colorsys.hsv_to_rgb(hue / 360, saturation / 100, value / 100)
+    )
+
+
+def describe_color(color):
+    return "off" if color is None else f"HSV({color[0]}, {color[1]}, {color[2]})"
+
+
+def upcoming_colors(schedule, now, rows=DASHBOARD_SCHEDULE_ROWS):
+    """
+    The warning color now and at each following change within DASHBOARD_SCHEDULE_HORIZON.
+
+    Returns:
+        list: (local time, color tuple or None for off), at most rows of them
+    """
+    upcoming = [(now, schedule.color_at(now))]
+    end = now + DASHBOARD_SCHEDULE_HORIZON
+    at = now
+    # Breakpoints hidden under an override don't change the color, so allow for skipping some
+    for _ in range(rows * 100):
+        at = schedule.next_change(at)
+        if at is None or at > end or len(upcoming) >= rows:
+            break
+        color = schedule.color_at(at)
+        if color != upcoming[-1][1]:
+            upcoming.append((at, color))
+    return upcoming
+
+
+class Dashboard:
+    """
+    State shared by every open dashboard page.
+
+    One task reads the controller's status and stats every DASHBOARD_REFRESH seconds. Both are
+    answered from tracked state, so they never reach the bulbs. When what's shown changes, the
+    task pushes it to each open page over the page's websocket. Pages don't poll, and opening
+    more of them adds no bulb traffic.
+    """
+
+    def __init__(self, send, schedule):
+        self.send = send  # Coroutine function: message -> response, through the daemon or a local controller
+        self.schedule = schedule
+        self.snapshot = None  # Latest state shown, or None before the first read
+        self.pages = set()  # Functions that update one open page from a snapshot
+        self.refresh_lock = asyncio.Lock()
+
+    async def refresh(self):
+        """Read the state and push it to the open pages if it changed."""
+        async with self.refresh_lock:
+            # Kept out of the latency stats, which every client of the daemon shares
+            status = await self.send({"action": "status", "recordLatency": False})
+            stats = await self.send({"action": "stats", "recordLatency": False})
+            if status.get("status") != "ok":
+                raise RuntimeError(status.get("message", "status failed"))
+
+            # Ages are left out, so an unchanged state isn't pushed again every refresh
+            operations = stats.get("stats", {}).get("operations", {})
+            snapshot = {
+                "has_issues": status.get("has_issues"),
+                "request": status.get("request"),
+                "animating": status.get("animating"),
+                "discovering": status.get("discovering"),
+                "lights": [{key: value for key, value in light.items() if key != "age_s"}
+                           for light in status.get("lights", [])],
+                "schedule": [(at.strftime('%a %H:%M'), color)
+                             for at, color in upcoming_colors(self.schedule, datetime.datetime.now())],
+                "latency": {name: operation for name, operation in operations.items()
+                            if name.startswith(DASHBOARD_OPERATIONS)}
+            }
+            if snapshot == self.snapshot:
+                return
+            self.snapshot = snapshot
+            for update in list(self.pages):
+                update(snapshot)
+
+    async def refresh_loop(self):
+        """Background task that keeps the snapshot current, logging each new error once."""
+        error = None
+        while True:
+            try:
+                await self.refresh()
+                error = None
+            except Exception as e:
+                if str(e) != error:
+                    print(f"Dashboard refresh failed: {e}", file=sys.stderr)
+                error = str(e)
+            await asyncio.sleep(DASHBOARD_REFRESH)
+
+    async def request(self, message):
+        """Send a light command from a page and push the resulting state at once."""
+        response = await self.send(message)
+        with contextlib.suppress(Exception):
+            await self.refresh()
+        return response
+
+
+def build_dashboard_page(dashboard):
+    """Lay out one dashboard page and register it for pushed updates."""
+    ui.label("Punch-Up Light").classes('text-2xl')
+
+    with ui.row().classes('items-center'):
+        swatch = ui.element('div').style('width: 48px; height: 48px; border-radius: 50%')
+        summary = ui.label()
+
+    lights = ui.table(columns=[
+        {"name": "name", "label": "Light", "field": "name", "align": "left"},
+        {"name": "state", "label": "Showing", "field": "state", "align": "left"},
+        {"name": "connection", "label": "Connection", "field": "connection", "align": "left"}
+    ], rows=[], row_key="name")
+
+    with ui.card():
+        ui.label("Set a color").classes('text-lg')
+        hue = ui.number("Hue", value=0, min=punch_light.HSV_HUE_MIN, max=punch_light.HSV_HUE_MAX, precision=0)
+        saturation = ui.number("Saturation", value=100, min=punch_light.HSV_SAT_MIN, max=punch_light.HSV_SAT_MAX,
+                               precision=0)
+        value = ui.number("Value", value=100, min=punch_light.HSV_VAL_MIN, max=punch_light.HSV_VAL_MAX, precision=0)
+        result = ui.label()
+
+        async def send(message):
+            try:
+                response = await dashboard.request(message)
+            except Exception as e:
+                response = {"status": "error", "message": str(e)}
+            if response.get("status") == "ok":
+                result.set_text("Done" + (" (superseded)" if response.get("superseded") else ""))
+            else:
+                result.set_text(f"Error: {response.get('message')}")
+
+        async def set_color():
+            # Sent like the extension's messages, so it's checked by validate_hsv like theirs
+            await send({"action": "set_color", "hue": hue.value, "saturation": saturation.value, "value": value.value})
+
+        with ui.row():
+            ui.button("Set", on_click=set_color)
+            ui.button("Off", on_click=lambda: send({"action": "turn_off"}))
+            ui.button("Issues", on_click=lambda: send({"action": "update_light", "hasIssues": True}))
+            ui.button("No issues", on_click=lambda: send({"action": "update_light", "hasIssues": False}))
+
+    ui.label("Upcoming warning colors").classes('text-lg')
+    schedule = ui.column().classes('gap-1')
+
+    ui.label("Latency").classes('text-lg')
+    latency = ui.table(columns=[
+        {"name": name, "label": label, "field": name, "align": "left" if name == "operation" else "right"}
+        for name, label in (("operation", "Operation"), ("count", "Count"), ("errors", "Errors"),
+                            ("p50_ms", "p50 ms"), ("p95_ms", "p95 ms"), ("p99_ms", "p99 ms"))
+    ], rows=[], row_key="operation")
+
+    def update(snapshot):
+        shown = next((light for light in snapshot["lights"] if light.get("is_on") is not None), None)
+        color = None
+        if shown and shown["is_on"] and shown["color"]:
+            color = (shown["color"]["hue"], shown["color"]["saturation"], shown["color"]["value"])
+        swatch.style(f'background: {css_color(color)}')
+
+        if snapshot["discovering"]:
+            summary.set_text("Looking for lights...")
+        elif snapshot["animating"]:
+            summary.set_text("Playing an animation")
+        elif snapshot["has_issues"] is None:
+            summary.set_text("No issue state reported yet")
+        else:
+            summary.set_text("Punch issues" if snapshot["has_issues"] else "No punch issues")
+
+        lights.rows[:] = [{
+            "name": light.get("alias") or light["host"],
+            "state": "unknown" if light.get("is_on") is None else describe_color(
+                (light["color"]["hue"], light["color"]["saturation"], light["color"]["value"])
+                if light["is_on"] and light["color"] else None
+            ),
+            "connection": light.get("message") or ("degraded" if light["degraded"]
+                                                   else "connected" if light["connected"] else "not connected")
+        } for light in snapshot["lights"]]
+        lights.update()
+
+        schedule.clear()
+        with schedule:
+            for at, color in snapshot["schedule"]:
+                with ui.row().classes('items-center gap-2'):
+                    ui.element('div').style(f'width: 16px; height: 16px; background: {css_color(color)}')
+                    ui.label(f"{at}  {describe_color(color)}")
+
+        latency.rows[:] = [{"operation": name, **operation} for name, operation in snapshot["latency"].items()]
+        latency.update()
+
+    dashboard.pages.add(update)
+    ui.context.client.on_disconnect(lambda: dashboard.pages.discard(update))
+    if dashboard.snapshot is not None:
+        update(dashboard.snapshot)
+
+
+async def main():
+    """
+    Serve the dashboard page until stopped.
+
+    Uses the controller daemon when it's running. Otherwise this process controls the lights and
+    serves the daemon socket itself, so the CLI and native hosts share its connection to them.
+    """
+    parser = argparse.ArgumentParser(
+        description="Serve a live page with the light state, upcoming colors and latencies."
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DASHBOARD_PORT, help=f"Port to listen on (default {DASHBOARD_PORT})")
+    args = parser.parse_args()
+
+    connection = controller = daemon_server = None
+    try:
+        connection = await punch_light.DaemonConnection.open()
+        print("Showing the controller daemon's lights", file=sys.stderr)
+        message_ids = itertools.count(1)
+
+        async def send(message):
+            nonlocal connection
+            if connection.receiver.done():
+                # The daemon restarted; pick it up again
+                connection.close()
+                connection = await punch_light.DaemonConnection.open()
+            message_id = f"dashboard-{next(message_ids)}"
+            return await (await connection.send({**message, "id": message_id}, message_id))
+
+        schedule = punch_light.load_schedule()
+
+    except punch_light.DaemonUnavailableError:
+        controller = await punch_light.start_controller()
+        daemon_server = await punch_light.start_daemon_server(controller)
+        print(f"Controller daemon listening on {punch_light.SOCKET_PATH}", file=sys.stderr)
+
+        async def send(message):
+            return await punch_light.handle_message(controller, message)
+
+        schedule = controller.schedule
+
+    dashboard = Dashboard(send, schedule)
+    refresh_task = asyncio.create_task(dashboard.refresh_loop())
+
+    @ui.page('/')
+    def page():
+        build_dashboard_page(dashboard)
+
+    web = FastAPI()
+    ui.run_with(web, title="Punch-Up Light")
+    server = uvicorn.Server(uvicorn.Config(web, host=args.host, port=args.port, log_level="warning"))
+
+    # Let uvicorn close the pages' websockets before the controller stops
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: setattr(server, 'should_exit', True))
+    print(f"Dashboard at http://{args.host}:{args.port}", file=sys.stderr)
+
+    try:
+        await server.serve()
+    finally:
+        print("Dashboard stopping", file=sys.stderr)
+        refresh_task.cancel()
+        if connection is not None:
+            connection.close()
+        if controller is not None:
+            daemon_server.close()
+            punch_light.SOCKET_PATH.unlink(missing_ok=True)
+            controller.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Punch-Up Light Schedule Preview
+Evaluates the warning color schedule over any time range and exports it, for a look ahead.
+
+The schedule (punch-light-schedule.json, or the built-in one) is loaded the way the controller in
+punch-light-controller.py loads it, and every sample is the color the light would show at that time.
+Output is CSV or JSON, or a PNG or HTML color strip.
+"""
+
+import argparse
+import contextlib
+import datetime
+import html
+import json
+import struct
+import sys
+import time
+import zlib
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    print("Error: the preview needs NumPy; install the Pipfile's packages with 'pipenv install'", file=sys.stderr)
+    sys.exit(1)
+
+from load_controller import load_controller
+
+punch_light = load_controller()
+
+PREVIEW_STEP_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+PREVIEW_STRIP_HEIGHT = 48  # Pixels
+PREVIEW_OFF_RGB = (32, 32, 32)  # How 'off' is drawn
+EPOCH = datetime.datetime(1970, 1, 1)  # Sample times are local wall-clock seconds since this
+
+
+def parse_preview_step(text):
+    """Parse a sample step like '90', '30s', '15m', '1h' or '1d' into whole seconds."""
+    unit = PREVIEW_STEP_UNITS.get(text[-1:].lower())
+    try:
+        seconds = int(text[:-1] if unit else text) * (unit or 1)
+    except ValueError:
+        seconds = 0
+    if seconds < 1:
+        raise ValueError(f"Invalid step: {text!r} (expected whole seconds, or like '30s', '15m', '1h', '1d')")
+    return seconds
+
+
+def preview_rgb(on, hsv):
+    """Convert bulb colors to an (n, 3) uint8 RGB array, drawing 'off' as PREVIEW_OFF_RGB."""
+    h = hsv[:, 0] % 360 / 60.0
+    s = hsv[:, 1] / 100.0
+    v = hsv[:, 2] / 100.0
+    sector = np.floor(h).astype(int) % 6
+    f = h - np.floor(h)
+    p, q, t = v * (1 - s), v * (1 - s * f), v * (1 - s * (1 - f))
+    rgb = np.choose(sector[:, None], [
+        np.stack(channels, axis=1)
+        for channels in ((v, t, p), (q, v, p), (p, v, t), (p, q, v), (t, p, v), (v, p, q))
+    ])
+    rgb = np.round(rgb * 255).astype(np.uint8)
+    rgb[~on] = PREVIEW_OFF_RGB
+    return rgb
+
+
+def preview_changes(on, hsv):
+    """Indexes of the samples whose color differs from the previous sample's (always including the first)."""
+    changed = np.ones(len(on), dtype=bool)
+    changed[1:] = (on[1:] != on[:-1]) | np.any(hsv[1:] != hsv[:-1], axis=1)
+    return np.flatnonzero(changed)
+
+
+def preview_labels(times):
+    """ISO 8601 local times for an array of wall-clock seconds since the epoch."""
+    return times.astype('datetime64[s]').astype(str)
+
+
+def write_preview_csv(f, times, on, hsv):
+    f.write("time,hue,saturation,value\n")
+    for label, is_on, (hue, saturation, value) in zip(preview_labels(times), on.tolist(), hsv.tolist()):
+        f.write(f"{label},{hue},{saturation},{value}\n" if is_on else f"{label},off,,\n")
+
+
+def write_preview_json(f, times, on, hsv, step):
+    colors = [
+        {"hue": hue, "saturation": saturation, "value": value} if is_on else "off"
+        for is_on, (hue, saturation, value) in zip(on.tolist(), hsv.tolist())
+    ]
+    json.dump({
+        "step_s": step,
+        "samples": [{"time": label, "color": color} for label, color in zip(preview_labels(times).tolist(), colors)]
+    }, f)
+
+
+def write_preview_png(f, on, hsv, width):
+    """Write a color strip PNG, one column per sample or width columns if there are more samples."""
+    columns = min(len(on), width)
+    picked = np.arange(columns) * len(on) // columns
+    row = b'\x00' + preview_rgb(on[picked], hsv[picked]).tobytes()  # Filter type 0, then RGB pixels
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    f.write(b'\x89PNG\r\n\x1a\n')
+    f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', columns, PREVIEW_STRIP_HEIGHT, 8, 2, 0, 0, 0)))
+    f.write(chunk(b'IDAT', zlib.compress(row * PREVIEW_STRIP_HEIGHT, 9)))
+    f.write(chunk(b'IEND', b''))
+
+
+def write_preview_html(f, times, on, hsv, step):
+    """Write a color strip page with one block per color, labelled with its times on hover."""
+    changes = preview_changes(on, hsv).tolist()
+    ends = changes[1:] + [len(times)]
+    labels = preview_labels(times)
+    rgb = preview_rgb(on, hsv)
+    end_label = preview_labels(times[-1:] + step)[0]
+
+    blocks = []
+    for first, last in zip(changes, ends):
+        color = "off" if not on[first] else "HSV({}, {}, {})".format(*hsv[first].tolist())
+        until = labels[last] if last < len(times) else end_label
+        blocks.append(
+            f'<div style="flex: {last - first}; background: rgb{tuple(rgb[first].tolist())}" '
+            f'title="{html.escape(f"{labels[first]} to {until}: {color}")}"></div>'
+        )
+
+    f.write(f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Punch light schedule preview</title>
+<style>
+  body {{ font-family: sans-serif; margin: 2em; }}
+  .strip {{ display: flex; height: {PREVIEW_STRIP_HEIGHT * 2}px; border: 1px solid #888; }}
+  .range {{ display: flex; justify-content: space-between; color: #555; }}
+</style>
+</head>
+<body>
+<h1>Warning color from {labels[0]} to {end_label}</h1>
+<p>One sample every {step} seconds, {len(blocks)} color changes. Hover over the strip for times and colors.</p>
+<div class="strip">
+{chr(10).join(blocks)}
+</div>
+<div class="range"><span>{labels[0]}</span><span>{end_label}</span></div>
+</body>
+</html>
+""")
+
+
+def main():
+    """Evaluate the warning color schedule over a time range and export it."""
+    today = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    parser = argparse.ArgumentParser(
+        description="Preview the warning color schedule (with issues) over a time range."
+    )
+    parser.add_argument("--start", type=datetime.datetime.fromisoformat,
+                        default=today - datetime.timedelta(days=today.weekday()),
+                        help="First sample, local time like '2026-12-24 09:00' (default: this Monday 00:00)")
+    parser.add_argument("--end", type=datetime.datetime.fromisoformat,
+                        help="Stop before this local time (default: --days after --start)")
+    parser.add_argument("--days", type=float, default=7, help="Length of the range in days (default 7)")
+    parser.add_argument("--step", default="15m", help="Time between samples, like '60', '30s', '15m', '1h' (default 15m)")
+    parser.add_argument("--changes", action="store_true", help="Only list samples where the color changes (CSV/JSON)")
+    parser.add_argument("--output", "-o", help="Write to this file; .csv, .json, .png or .html picks the format "
+                                               "(default: CSV on stdout)")
+    parser.add_argument("--width", type=int, default=1440, help="Most pixels across a PNG strip (default 1440)")
+    parser.add_argument("--verify", action="store_true",
+                        help="Check every sample against the live color calculation and fail on any difference")
+    args = parser.parse_args()
+
+    try:
+        step = parse_preview_step(args.step)
+    except ValueError as e:
+        parser.error(str(e))
+    start = args.start.replace(microsecond=0)
+    end = args.end or start + datetime.timedelta(days=args.days)
+    if end <= start:
+        parser.error("The range ends before it starts")
+    if args.width < 1:
+        parser.error("--width must be at least 1")
+
+    output_format = Path(args.output).suffix.lower().lstrip('.') if args.output else 'csv'
+    if output_format not in ('csv', 'json', 'png', 'html'):
+        parser.error(f"Unknown output format: {args.output!r} (use a .csv, .json, .png or .html file)")
+
+    schedule = punch_light.load_schedule()
+    started = time.perf_counter()
+    times, on, hsv = schedule.colors_between(start, end, step)
+    print(f"Computed {len(times)} colors in {(time.perf_counter() - started) * 1000:.1f} ms", file=sys.stderr)
+
+    if args.verify:
+        mismatches = 0
+        for t, is_on, color in zip(times.tolist(), on.tolist(), hsv.tolist()):
+            live = schedule.color_at(EPOCH + datetime.timedelta(seconds=t))
+            if live != (tuple(color) if is_on else None):
+                mismatches += 1
+                if mismatches <= 10:
+                    print(f"Mismatch at {EPOCH + datetime.timedelta(seconds=t)}: live {live}, preview "
+                          f"{tuple(color) if is_on else None}", file=sys.stderr)
+        print(f"Verified {len(times)} samples against the live calculation: {mismatches} mismatches", file=sys.stderr)
+        if mismatches:
+            sys.exit(1)
+
+    if args.changes and output_format in ('csv', 'json'):
+        picked = preview_changes(on, hsv)
+        times, on, hsv = times[picked], on[picked], hsv[picked]
+
+    if output_format == 'png':
+        with open(args.output, 'wb') as f:
+            write_preview_png(f, on, hsv, args.width)
+    else:
+        with (open(args.output, 'w', newline='') if args.output else contextlib.nullcontext(sys.stdout)) as f:
+            if output_format == 'csv':
+                write_preview_csv(f, times, on, hsv)
+            elif output_format == 'json':
+                write_preview_json(f, times, on, hsv, step)
+            else:
+                write_preview_html(f, times, on, hsv, step)
+
+    if args.output:
+        print(f"Wrote {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Punch-Up Light Script Runner
+Runs many actions from one process over one connection, for calibrating colors and load testing.
+
+Each action is sent without waiting for the previous response, and the runner prints how long
+each one took. It goes through the controller daemon when it's running. Otherwise it controls
+the lights itself with the controller from punch-light-controller.py.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from load_controller import load_controller
+
+punch_light = load_controller()
+
+MAX_SCRIPT_STEPS = 10000  # Actions and waits, with loops expanded
+MAX_SCRIPT_WAIT = 60 * 60  # Seconds
+
+
+def parse_wait(seconds):
+    if isinstance(seconds, bool) or not isinstance(seconds, (int, float)) or not 0 <= seconds <= MAX_SCRIPT_WAIT:
+        raise ValueError(f"Invalid wait: {seconds!r} (must be 0-{MAX_SCRIPT_WAIT} seconds)")
+    return float(seconds)
+
+
+def parse_script(text):
+    """
+    Parse a script into a flat list of steps.
+
+    A script is a sequence of JSON steps, one after another (lines starting with '#' are
+    skipped), or a single JSON list of them. A step is a message in the shape handle_message
+    takes (an action or a batch), {"wait": seconds}, or {"loop": count, "steps": [...]}.
+
+    Returns:
+        list: ('send', message) and ('wait', seconds) tuples, loops expanded
+
+    Raises:
+        ValueError: If a step is invalid or the script expands past MAX_SCRIPT_STEPS
+    """
+    # Blank out comments rather than dropping them, so error positions still match the file
+    text = '\n'.join('' if line.lstrip().startswith('#') else line for line in text.splitlines())
+    decoder = json.JSONDecoder()
+    spec = []
+    position = 0
+    while True:
+        while position < len(text) and text[position].isspace():
+            position += 1
+        if position == len(text):
+            break
+        try:
+            item, position = decoder.raw_decode(text, position)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        spec.append(item)
+
+    # A script that is one list holds the steps; a batch inside it is a nested list
+    if len(spec) == 1 and isinstance(spec[0], list):
+        spec = spec[0]
+
+    def expand(items):
+        steps = []
+        for item in items:
+            if isinstance(item, dict) and 'loop' in item:
+                count = item['loop']
+                if isinstance(count, bool) or not isinstance(count, int) or count < 1:
+                    raise ValueError(f"Invalid loop count: {count!r} (must be a positive integer)")
+                if not isinstance(item.get('steps'), list):
+                    raise ValueError("A loop needs 'steps' (a list)")
+                body = expand(item['steps'])
+                if len(steps) + len(body) * count > MAX_SCRIPT_STEPS:
+                    raise ValueError(f"Script too long: more than {MAX_SCRIPT_STEPS} steps with loops expanded")
+                steps.extend(body * count)
+            elif isinstance(item, dict) and 'wait' in item and 'action' not in item:
+                steps.append(('wait', parse_wait(item['wait'])))
+            elif isinstance(item, dict) and 'action' in item:
+                steps.append(('send', item))
+            elif isinstance(item, list) and 0 < len(item) <= punch_light.MAX_BATCH_SIZE and all(
+                    isinstance(action, dict) and 'action' in action for action in item):
+                steps.append(('send', item))
+            else:
+                raise ValueError(f"Invalid step: {json.dumps(item)[:80]} (expected an action, a batch of "
+                                 f"up to {punch_light.MAX_BATCH_SIZE} actions, a wait or a loop)")
+
+            if len(steps) > MAX_SCRIPT_STEPS:
+                raise ValueError(f"Script too long: more than {MAX_SCRIPT_STEPS} steps with loops expanded")
+        return steps
+
+    return expand(spec)
+
+
+def tag_script_message(message, number):
+    """
+    Give a script message (or each action of a batch) an id derived from its step number.
+
+    Returns:
+        tuple: (tagged message, id its response is matched by)
+    """
+    if isinstance(message, list):
+        tagged = [{**action, "id": f"script-{number}-{index}"} for index, action in enumerate(message)]
+        return tagged, tagged[0]["id"]
+    return {**message, "id": f"script-{number}"}, f"script-{number}"
+
+
+async def run_script(steps, send):
+    """
+    Run script steps in order, sending each message without waiting for earlier responses.
+
+    A wait pauses before the next message is sent; it doesn't wait for responses.
+
+    Args:
+        steps: Steps from parse_script
+        send: Coroutine function taking (message, step number) that sends the message and
+              returns an awaitable for its response
+
+    Returns:
+        list: (message, response, seconds from send to response) for each message, in script order
+    """
+    async def timed(message, response, sent):
+        try:
+            response = await response
+        except punch_light.DaemonUnavailableError as e:
+            response = {"status": "error", "message": str(e)}
+        return message, response, time.perf_counter() - sent
+
+    tasks = []
+    for kind, step in steps:
+        if kind == 'wait':
+            await asyncio.sleep(step)
+            continue
+        sent = time.perf_counter()
+        response = await send(step, len(tasks) + 1)
+        tasks.append(asyncio.create_task(timed(step, response, sent)))
+
+    return await asyncio.gather(*tasks)
+
+
+def describe_script_message(message):
+    """Short label for a script message, like 'set_color 120,100,80'."""
+    if isinstance(message, list):
+        return f"batch of {len(message)}"
+    action = message['action']
+    if action == 'set_color':
+        return f"{action} {message.get('hue', 0)},{message.get('saturation', 100)},{message.get('value', 100)}"
+    if action == 'update_light':
+        return f"{action} {str(message.get('hasIssues', False)).lower()}"
+    if action == 'animate' and 'preset' in message:
+        return f"{action} {message['preset']}"
+    return action
+
+
+def print_script_report(results, elapsed):
+    """Print each step's outcome and latency, then a latency summary per action."""
+    histograms = {}
+    errors = 0
+    for number, (message, response, latency) in enumerate(results, 1):
+        responses = response if isinstance(response, list) else [response]
+        failed = [r for r in responses if r.get("status") != "ok"]
+        if failed:
+            outcome = f"error: {failed[0].get('message')}"
+        elif all(r.get("superseded") for r in responses):
+            outcome = "superseded"
+        else:
+            outcome = "ok"
+        errors += bool(failed)
+
+        label = describe_script_message(message)
+        print(f"{number:>5}  {label:<28} {latency * 1000:>9.1f} ms  {outcome}")
+
+        name = "batch" if isinstance(message, list) else message['action']
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = punch_light.LatencyHistogram()
+        histogram.record(latency, error=bool(failed))
+
+    print(json.dumps({
+        "actions": len(results),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "latency": {name: histogram.snapshot() for name, histogram in sorted(histograms.items())}
+    }, indent=2))
+    return errors
+
+
+async def main():
+    """
+    Run a script of actions from a file ('-' for stdin) over one connection and report timings.
+
+    Uses the controller daemon when it's running. Otherwise this process controls the lights
+    itself, discovering them once for the whole script.
+    """
+    parser = argparse.ArgumentParser(description="Run a script of light actions and time each one.")
+    parser.add_argument("file", nargs="?", default="-", help="Script to run (default: read it from stdin)")
+    args = parser.parse_args()
+
+    try:
+        if args.file == '-':
+            text = sys.stdin.read()
+        else:
+            with open(args.file, 'r') as f:
+                text = f.read()
+        steps = parse_script(text)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    actions = sum(kind == 'send' for kind, _ in steps)
+    connection = controller = None
+    try:
+        connection = await punch_light.DaemonConnection.open()
+        print(f"Running {actions} actions through the controller daemon", file=sys.stderr)
+
+        async def send(message, number):
+            return await connection.send(*tag_script_message(message, number))
+
+    except punch_light.DaemonUnavailableError:
+        # Reach the lights before the clock starts, so step timings don't include discovery
+        controller = punch_light.PunchLightController()
+        try:
+            await controller.ensure_lights()
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Running {actions} actions", file=sys.stderr)
+
+        async def send(message, number):
+            return asyncio.create_task(punch_light.handle_message(controller, message))
+
+    started = time.perf_counter()
+    try:
+        results = await run_script(steps, send)
+    finally:
+        if connection is not None:
+            connection.close()
+        if controller is not None:
+            controller.stop()
+
+    if print_script_report(results, time.perf_counter() - started):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Punch-Up Light Team Server
+Shows punch compliance for a whole team on one controller's lights.
+
+Each person's extension (or a small relay) posts its reports over HTTP, and each light shows the
+warning color while anyone reporting to it has issues. The lights are driven by the controller
+from punch-light-controller.py, which this server runs in-process.
+"""
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import datetime
+import hmac
+import json
+import os
+import signal
+import sys
+import time
+
+from load_controller import load_controller
+
+punch_light = load_controller()
+
+TEAM_PORT = 8787
+TEAM_REPORT_TTL = 24 * 60 * 60  # Seconds a report counts unless it's sent again, like the extension's 24h reminder
+TEAM_BATCH_WINDOW = 0.25  # Seconds of reports gathered into one round of light writes
+MAX_TEAM_REPORTS = 10000  # Most (light, user) pairs tracked at once
+MAX_TEAM_BATCH = 1000  # Most reports in one POST
+MAX_TEAM_NAME = 100  # Longest user or light name
+MAX_HTTP_HEADERS = 50
+
+
+class TeamState:
+    """
+    The latest report from each user for each light, each expiring TEAM_REPORT_TTL after it arrived.
+
+    Every light keeps running counts of its reporters and of those with issues, updated as each
+    report arrives or expires, so a report never looks at any other user's. Reports are kept
+    oldest first (they all live equally long), so expiring them only looks at the oldest.
+    """
+
+    def __init__(self, ttl=TEAM_REPORT_TTL):
+        self.ttl = ttl
+        self.reports = collections.OrderedDict()  # (light, user) -> (has_issues, expires_at), oldest first
+        self.reporters = collections.Counter()  # light -> users with a live report
+        self.with_issues = collections.Counter()  # light -> users whose live report has issues
+
+    def light_state(self, light):
+        """'issues' if anyone reporting to the light has issues, 'clear' if nobody does, None if nobody reports."""
+        if self.with_issues[light]:
+            return 'issues'
+        return 'clear' if self.reporters[light] else None
+
+    def report(self, light, user, has_issues, now):
+        """
+        Record a user's report for a light, replacing their previous one.
+
+        Returns:
+            bool: Whether the light's state changed
+
+        Raises:
+            OverflowError: If this is a new (light, user) pair and MAX_TEAM_REPORTS are already tracked
+        """
+        before = self.light_state(light)
+        previous = self.reports.pop((light, user), None)
+        if previous is None:
+            if len(self.reports) >= MAX_TEAM_REPORTS:
+                raise OverflowError(f"Too many reporters (max allowed: {MAX_TEAM_REPORTS})")
+            self.reporters[light] += 1
+        elif previous[0]:
+            self._decrement(self.with_issues, light)
+
+        if has_issues:
+            self.with_issues[light] += 1
+        self.reports[(light, user)] = (has_issues, now + self.ttl)
+        return self.light_state(light) != before
+
+    def expire(self, now):
+        """
+        Drop reports that expired by now.
+
+        Returns:
+            set: Lights whose state changed
+        """
+        before = {}
+        while self.reports:
+            (light, user), (has_issues, expires_at) = next(iter(self.reports.items()))
+            if expires_at > now:
+                break
+            before.setdefault(light, self.light_state(light))
+            del self.reports[(light, user)]
+            self._decrement(self.reporters, light)
+            if has_issues:
+                self._decrement(self.with_issues, light)
+        return {light for light, state in before.items() if self.light_state(light) != state}
+
+    def next_expiry(self):
+        """time.monotonic() when the oldest report expires, or None if there are none."""
+        return next(iter(self.reports.values()))[1] if self.reports else None
+
+    @staticmethod
+    def _decrement(counter, light):
+        counter[light] -= 1
+        if not counter[light]:
+            del counter[light]
+
+
+class HTTPError(Exception):
+    """A request the team server answers with an HTTP error status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+HTTP_REASONS = {
+    200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 503: "Service Unavailable"
+}
+
+
+async def read_http_request(reader):
+    """
+    Read one HTTP/1.1 request with a Content-Length body (or none).
+
+    Returns:
+        tuple: (method, path, headers with lowercase names, body bytes)
+        None: If the client closed the connection between requests
+
+    Raises:
+        HTTPError: If the request is malformed or too large
+    """
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode('latin-1').split()
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        if len(headers) >= MAX_HTTP_HEADERS:
+            raise HTTPError(400, "Too many headers")
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if 'transfer-encoding' in headers:
+        raise HTTPError(400, "Chunked bodies aren't supported; send a Content-Length")
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length")
+    if not 0 <= length <= punch_light.MAX_MESSAGE_SIZE:
+        raise HTTPError(413, f"Body too large: {length} bytes (max allowed: {punch_light.MAX_MESSAGE_SIZE})")
+
+    body = await reader.readexactly(length)
+    return method, target.split('?', 1)[0], headers, body
+
+
+async def write_http_response(writer, status, payload, keep_alive=True):
+    body = json.dumps(payload).encode('utf-8')
+    head = [
+        f"HTTP/1.1 {status} {HTTP_REASONS[status]}",
+        "Content-Type: application/json",
+        f"Content-Length: {len(body)}"
+    ]
+    if not keep_alive:
+        head.append("Connection: close")
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body)
+    await writer.drain()
+
+
+class TeamServer:
+    """
+    Drives the controller's lights from many users' reports, received over HTTP.
+
+    A report only updates TeamState and, if its light's state changed, marks the light. A flush
+    loop writes every marked light together after TEAM_BATCH_WINDOW, so a burst of reports costs
+    at most one write per light. Lights are matched to reports by alias or host, ignoring case.
+    """
+
+    def __init__(self, controller, ttl=TEAM_REPORT_TTL, token=None):
+        self.controller = controller
+        self.state = TeamState(ttl)
+        self.token = token  # Bearer token every request must carry, if set
+        self.dirty = set()  # Lights whose color needs to be worked out and written again
+        self.wake = asyncio.Event()  # Set when a light is marked
+        self.applied = {}  # Light -> (last color written or None for off, time.monotonic() it was written)
+        self.reports_received = 0
+        self.flush_task = None
+
+    def lights_by_name(self):
+        lights = {}
+        for light in self.controller.lights:
+            lights[light.host.lower()] = light
+            if light.alias:
+                lights[light.alias.lower()] = light
+        return lights
+
+    def target_color(self, state):
+        """The color for a light in the given TeamState state, or None for off."""
+        if state == 'issues':
+            return self.controller.get_warning_color()
+        if state == 'clear':
+            return self.controller.schedule.no_issues_color
+        return None
+
+    def add_reports(self, reports, now):
+        """
+        Validate and record a list of reports, marking lights whose state changed.
+
+        Raises:
+            HTTPError: If any report is invalid (none are recorded then) or too many users report
+        """
+        parsed = []
+        for report in reports:
+            if not isinstance(report, dict):
+                raise HTTPError(400, "Each report must be a JSON object")
+            light, user, has_issues = report.get('light'), report.get('user'), report.get('hasIssues')
+            for field, value in (('light', light), ('user', user)):
+                if not isinstance(value, str) or not value.strip() or len(value) > MAX_TEAM_NAME:
+                    raise HTTPError(400, f"Invalid {field}: must be a non-empty string of at most {MAX_TEAM_NAME} characters")
+            if not isinstance(has_issues, bool):
+                raise HTTPError(400, f"Invalid hasIssues value: must be boolean, got {type(has_issues).__name__}")
+            parsed.append((light.strip().lower(), user.strip(), has_issues))
+
+        for light, user, has_issues in parsed:
+            try:
+                changed = self.state.report(light, user, has_issues, now)
+            except OverflowError as e:
+                raise HTTPError(503, str(e))
+            if changed:
+                self.dirty.add(light)
+                self.wake.set()
+        self.reports_received += len(parsed)
+
+    async def flush_loop(self):
+        """Background task that writes marked lights, and follows expiring reports and color changes."""
+        while True:
+            waits = [punch_light.SCHEDULER_MAX_SLEEP]
+            expiry = self.state.next_expiry()
+            if expiry is not None:
+                waits.append(expiry - time.monotonic())
+            change = self.controller.next_color_change()
+            if change is not None:
+                waits.append((change - datetime.datetime.now()).total_seconds() + punch_light.COLOR_CHANGE_MARGIN)
+            if self.dirty:
+                waits.append(punch_light.DISCOVERY_BACKOFF_MIN)  # Lights left over from a round that couldn't reach them
+            if self.applied:
+                oldest = min(written for _, written in self.applied.values())
+                waits.append(oldest + punch_light.RESYNC_INTERVAL - time.monotonic())
+
+            with contextlib.suppress(TimeoutError):
+                async with asyncio.timeout(max(0, min(waits))):
+                    await self.wake.wait()
+
+            # Let the rest of a burst of reports land in this round
+            await asyncio.sleep(TEAM_BATCH_WINDOW)
+            self.wake.clear()
+            now = time.monotonic()
+            self.dirty |= self.state.expire(now) | self.expire_applied(now)
+
+            # The warning color changes over time, so lights with issues are always looked at again
+            lights, self.dirty = self.dirty | set(self.state.with_issues), set()
+            try:
+                with self.controller.metrics.timed("team.flush"):
+                    await self.write_lights(lights)
+            except Exception as e:
+                print(f"Error updating team lights: {e}", file=sys.stderr)
+                self.dirty |= lights
+
+    def expire_applied(self, now):
+        """
+        Forget colors written RESYNC_INTERVAL or more ago, so they're written again and the
+        bulb is re-read in case it was changed by hand or lost power.
+
+        Returns:
+            set: The lights that were forgotten
+        """
+        expired = {name for name, (_, written) in self.applied.items() if now - written >= punch_light.RESYNC_INTERVAL}
+        for name in expired:
+            del self.applied[name]
+        return expired
+
+    async def write_lights(self, names):
+        """Write the color for each named light, all at once. Lights that fail are marked again."""
+        if not self.controller.lights:
+            await self.controller.ensure_lights()
+
+        lights = self.lights_by_name()
+        deadline = punch_light.action_deadline('update_light')
+        writes = []
+        for name in names:
+            light = lights.get(name)
+            if light is None:
+                continue  # Nothing by that name to show it on; listed as unmatched in /status
+            color = self.target_color(self.state.light_state(name))
+            if name in self.applied and self.applied[name][0] == color:
+                continue
+            if color is None:
+                command = lambda light: light.apply_off()
+            else:
+                command = lambda light, color=color: light.apply_color(*color)
+            writes.append((name, color, light.submit(command, deadline)))
+
+        outcomes = await asyncio.gather(*(write for _, _, write in writes), return_exceptions=True)
+        for (name, color, _), outcome in zip(writes, outcomes):
+            if isinstance(outcome, BaseException):
+                print(f"Failed to update light {name}: {outcome}", file=sys.stderr)
+                self.dirty.add(name)
+                self.applied.pop(name, None)  # A failed write leaves the bulb's color unknown
+            else:
+                self.applied[name] = (color, time.monotonic())
+        self.controller.watch_degraded()
+
+    def snapshot(self):
+        lights = self.lights_by_name()
+        names = set(self.state.reporters) | {light.name.lower() for light in self.controller.lights}
+        return {
+            "status": "ok",
+            "reports": len(self.state.reports),
+            "reports_received": self.reports_received,
+            "lights": {
+                name: {
+                    "matched": name in lights,
+                    "state": self.state.light_state(name),
+                    "reporters": self.state.reporters[name],
+                    "with_issues": self.state.with_issues[name],
+                    "applied": (None if self.applied[name][0] is None else
+                                dict(zip(("hue", "saturation", "value"), self.applied[name][0])))
+                               if name in self.applied else "unknown"
+                }
+                for name in sorted(names)
+            },
+            "stats": self.controller.metrics.snapshot()
+        }
+
+    def route(self, method, path, headers, body):
+        """Handle one request, returning (HTTP status, JSON payload)."""
+        if self.token and not hmac.compare_digest(headers.get('authorization', '').encode(),
+                                                  f"Bearer {self.token}".encode()):
+            raise HTTPError(401, "Missing or wrong bearer token")
+
+        if path == '/report':
+            if method != 'POST':
+                raise HTTPError(405, "Use POST to send reports")
+            try:
+                reports = json.loads(body)
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                raise HTTPError(400, f"Invalid JSON: {e}")
+            reports = reports if isinstance(reports, list) else [reports]
+            if len(reports) > MAX_TEAM_BATCH:
+                raise HTTPError(413, f"Too many reports: {len(reports)} (max allowed: {MAX_TEAM_BATCH})")
+            self.add_reports(reports, time.monotonic())
+            return 200, {"status": "ok", "accepted": len(reports)}
+
+        if path == '/status':
+            if method != 'GET':
+                raise HTTPError(405, "Use GET for status")
+            return 200, self.snapshot()
+
+        raise HTTPError(404, f"No such endpoint: {path}")
+
+    async def serve_client(self, reader, writer):
+        """Answer requests on one connection, keeping it open between them unless asked not to."""
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    request = await read_http_request(reader)
+                    if request is None:
+                        break
+                    method, path, headers, body = request
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+                    status, payload = self.route(method, path, headers, body)
+                except HTTPError as e:
+                    status, payload, keep_alive = e.status, {"status": "error", "message": str(e)}, False
+                await write_http_response(writer, status, payload, keep_alive)
+                self.controller.metrics.record("team.request", time.perf_counter() - started, error=status != 200)
+                if not keep_alive:
+                    break
+        except (OSError, ValueError, asyncio.IncompleteReadError):
+            pass  # Client went away mid-request, or sent a line longer than the stream limit
+        finally:
+            writer.close()
+
+
+async def main():
+    """Serve team reports over HTTP and drive the lights from them."""
+    parser = argparse.ArgumentParser(
+        description="Show punch issues for a whole team: extensions POST reports, lights show the result."
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=TEAM_PORT, help=f"Port to listen on (default {TEAM_PORT})")
+    parser.add_argument("--ttl", type=float, default=TEAM_REPORT_TTL,
+                        help=f"Seconds a report counts unless it's sent again (default {TEAM_REPORT_TTL})")
+    args = parser.parse_args()
+    if args.ttl <= 0:
+        parser.error("--ttl must be positive")
+
+    # The lights follow the team's reports, not the journaled light command
+    controller = await punch_light.start_controller(scheduler=False)
+    server = TeamServer(controller, ttl=args.ttl, token=os.environ.get('PUNCH_LIGHT_TEAM_TOKEN') or None)
+    server.flush_task = asyncio.create_task(server.flush_loop())
+
+    if not server.token and args.host not in ('127.0.0.1', 'localhost', '::1'):
+        print("Warning: Listening beyond this machine without PUNCH_LIGHT_TEAM_TOKEN; anyone can send reports",
+              file=sys.stderr)
+
+    http_server = await asyncio.start_server(server.serve_client, args.host, args.port)
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    print(f"Team server listening on http://{args.host}:{args.port}", file=sys.stderr)
+
+    try:
+        async with http_server:
+            await http_server.serve_forever()
+    except asyncio.CancelledError:
+        print("Team server stopping", file=sys.stderr)
+    finally:
+        server.flush_task.cancel()
+        controller.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -28,6 +28,61 @@ cd "$SCRIPT_DIR" || {
 # This prevents attacks via malicious binaries in user directories
 export PATH="/usr/local/bin:/usr/bin:/bin"
 
+# Python interpreters found by the strategies below are cached here, because asking pipenv
+# for the virtualenv takes longer than starting the controller itself
+PYTHON_CACHE="$SCRIPT_DIR/punch-light-python.cache"
+
+PYTHON_LOCATIONS=(
+    "/usr/local/bin/python3"
+    "/usr/bin/python3"
+    "/usr/local/bin/python"
+    "/usr/bin/python"
+)
+
+# Check an interpreter path is one the strategies below would pick
+is_allowed_python() {
+    local path="$1"
+    local system_python
+
+    # No relative paths or parent directory tricks
+    [[ "$path" == /* && "$path" != *..* ]] || return 1
+
+    if [[ "$path" =~ ^"$HOME"/.local/share/virtualenvs/[^/]+/bin/python$ ]] || \
+       [[ "$path" =~ ^"$HOME"/.virtualenvs/[^/]+/bin/python$ ]]; then
+        return 0
+    fi
+    for system_python in "${PYTHON_LOCATIONS[@]}"; do
+        [ "$path" = "$system_python" ] && return 0
+    done
+    return 1
+}
+
+# Remember an interpreter for the next launch; a failure here only costs speed
+cache_python() {
+    local temp_file
+    temp_file=$(mktemp "$PYTHON_CACHE.XXXXXX" 2>/dev/null) || return 0
+    if printf '%s\n' "$1" > "$temp_file" && mv -f "$temp_file" "$PYTHON_CACHE"; then
+        return 0
+    fi
+    rm -f "$temp_file"
+    return 0
+}
+
+# Fast path: reuse the cached interpreter without spawning pipenv. The cache is only trusted if
+# it's a regular file owned by this user that nobody else can write, it's newer than the Pipfile
+# and Pipfile.lock (so reinstalling dependencies invalidates it), and it names an allowed interpreter.
+# Delete punch-light-python.cache to force a fresh lookup.
+if [ -f "$PYTHON_CACHE" ] && [ ! -L "$PYTHON_CACHE" ] && [ -O "$PYTHON_CACHE" ] && \
+   [ -z "$(find "$PYTHON_CACHE" -maxdepth 0 \( -perm -020 -o -perm -002 \) 2>/dev/null)" ] && \
+   [ "$PYTHON_CACHE" -nt "$SCRIPT_DIR/Pipfile" ] && \
+   { [ ! -e "$SCRIPT_DIR/Pipfile.lock" ] || [ "$PYTHON_CACHE" -nt "$SCRIPT_DIR/Pipfile.lock" ]; }; then
+    CACHED_PYTHON=""
+    IFS= read -r CACHED_PYTHON < "$PYTHON_CACHE" || true
+    if is_allowed_python "$CACHED_PYTHON" && [ -f "$CACHED_PYTHON" ] && [ -x "$CACHED_PYTHON" ]; then
+        exec "$CACHED_PYTHON" "$SCRIPT_DIR/punch-light-controller.py" native
+    fi
+fi
+
 # Strategy 1: Try pipenv virtualenv with absolute path
 PIPENV_LOCATIONS=(
     "/usr/local/bin/pipenv"
@@ -49,6 +104,7 @@ for pipenv_path in "${PIPENV_LOCATIONS[@]}"; do
 
             # Verify it's a real executable Python binary
             if [ -x "$PYTHON_BIN" ] && "$PYTHON_BIN" --version &>/dev/null; then
+                cache_python "$PYTHON_BIN"
                 # Use absolute paths for everything to prevent PATH attacks
                 exec "$PYTHON_BIN" "$SCRIPT_DIR/punch-light-controller.py" native
             fi
@@ -57,17 +113,11 @@ for pipenv_path in "${PIPENV_LOCATIONS[@]}"; do
 done
 
 # Strategy 2: Try system Python with absolute paths
-PYTHON_LOCATIONS=(
-    "/usr/local/bin/python3"
-    "/usr/bin/python3"
-    "/usr/local/bin/python"
-    "/usr/bin/python"
-)
-
 for python_path in "${PYTHON_LOCATIONS[@]}"; do
     if [ -x "$python_path" ]; then
         # Verify kasa module is available
         if "$python_path" -c "import kasa" 2>/dev/null; then
+            cache_python "$python_path"
             # Use absolute paths to prevent execution of malicious scripts
             exec "$python_path" "$SCRIPT_DIR/punch-light-controller.py" native
         fi